@@ -1,32 +1,90 @@
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field
 
 # Libraries
 from langchain_openai import ChatOpenAI
-from langchain_neo4j import Neo4jGraph, GraphCypherQAChain
+from langchain_neo4j import GraphCypherQAChain
+from langchain_neo4j.chains.graph_qa.cypher import construct_schema, extract_cypher
 from langchain_core.prompts import PromptTemplate
 
+from graph_db import get_graph, warmup
+from graph_schema import ALLOWED_NODES, ensure_schema, load_schema_snapshot, save_schema_snapshot
+from entity_resolution import EntityIndex, normalize
+from cache import LRUTTLCache, CypherCache
+from intent_router import IntentRouter, ROUTER_CONFIDENCE
+from graph_version import GRAPH_META_LABEL, GraphVersionWatcher, read_graph_version
+from cypher_guard import CypherRejected, guard_cypher, run_read_only
+from neighborhood import fetch_neighborhood, NeighborhoodSnapshots
+
 # --- CONFIGURATION ---
 load_dotenv()
+# "fused": one structured call plans intent + subject entity + Cypher; "steps": one LLM call per step
+PLANNER_MODE = os.getenv("PLANNER_MODE", "fused").lower()
+# Threads fetching graph neighborhoods alongside answer generation (shared by all sessions)
+VISUALIZE_WORKERS = int(os.getenv("VISUALIZE_WORKERS", "4"))
+# How long a visualization waits for the fused plan's subject entity before extracting its own
+PLAN_WAIT_SECONDS = float(os.getenv("PLAN_WAIT_SECONDS", "8"))
+
+
+class QueryPlan(BaseModel):
+    """Structured output of the fused planning call."""
+    intent: Literal["DATA", "GENERAL"] = Field(description="DATA for graph/company/supply chain questions, GENERAL for chitchat or identity")
+    entity: str = Field(default="", description="The single most important subject entity, name only")
+    cypher: str = Field(default="", description="Cypher query answering a DATA question, empty for GENERAL")
+
 
 class NvidiaSentinelAgent:
     def __init__(self):
         self._validate_env()
         
         print("🔌 Connecting to the 'Market Mind' Database...")
+        self.schema_version = None
         try:
-            self.graph = Neo4jGraph(
-                url=os.getenv("NEO4J_URI"),
-                username=os.getenv("NEO4J_USERNAME"),
-                password=os.getenv("NEO4J_PASSWORD")
-            )
-            self.graph.refresh_schema()
+            # Shared pooled driver; the agent only reads, so its sessions go to readers
+            warmup()
+            self.graph = get_graph()
+            # Id lookups in generated Cypher need the per-label indexes (DDL needs the writer)
+            ensure_schema(get_graph(write=True))
+            # Schema: start from the ingesters' snapshot; introspect synchronously only on first run
+            self.schema_version = load_schema_snapshot(self.graph)
+            if self.schema_version is None:
+                self.schema_version = save_schema_snapshot(self.graph, read_graph_version(self.graph))
             print("✅ Database Connected.")
         except Exception as e:
             print(f"⚠️ Database Connection Failed: {e}")
             self.graph = None
         
+        # Entity Resolution: user strings -> exact node ids, without scanning the graph
+        self.entities = EntityIndex()
+        if self.graph and not self.entities.entities:
+            try:
+                self.entities.rebuild(self.graph)  # First run: no ingest has written a snapshot yet
+            except Exception as e:
+                print(f"⚠️ Entity index build failed: {e}")
+
+        # Local Intent Router: obvious cases never reach the LLM classifier
+        self.router = IntentRouter(entity_detector=self.entities.find_mentions)
+
+        # Answer Cache: repeated questions skip every LLM call until the graph changes
+        self.answer_cache = LRUTTLCache()
+        self.graph_version = GraphVersionWatcher(self.graph) if self.graph else None
+        self.cached_version = None
+
+        # Neighborhood Snapshots: precomputed ego graphs of hot entities (written by the ingesters)
+        self.neighborhoods = NeighborhoodSnapshots()
+
+        # Cypher Cache: question -> Cypher, persisted, invalidated by any schema change
+        self.cypher_cache = CypherCache()
+        self.cypher_schema_hash = None
+
+        # Background neighborhood fetches for ask_with_graph()
+        self.executor = ThreadPoolExecutor(max_workers=VISUALIZE_WORKERS, thread_name_prefix="sentinel-viz")
+
         # The Brain
         self.llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini")
         
@@ -71,17 +129,19 @@ class NvidiaSentinelAgent:
         3. FIND SUPPLIERS: Use [:SUPPLIES_TO|PARTNERS_WITH] and do NOT restrict the source to :Company (it could be a Product or Country).
         4. FIND RISKS: Look for nodes labeled :Event that -[:AFFECTS]-> Companies.
         5. CITATIONS: The Article might be connected to the Company OR the Product. Check both paths.
+        6. EXACT IDS: If "Resolved entities" are listed under the question, match them exactly, e.g. (c:Company {{id: 'TSMC'}}).
+           Only use toLower(x.id) CONTAINS '...' (always with a label) for names that were not resolved.
 
         Examples:
         Question: "What products does TSMC supply?"
-        Cypher: MATCH (c:Company)-[r]-(p:Product) 
-                WHERE toLower(c.id) CONTAINS 'tsmc' 
+        Resolved entities: Company {{id: 'TSMC'}}
+        Cypher: MATCH (c:Company {{id: 'TSMC'}})-[r]-(p:Product) 
                 OPTIONAL MATCH (c)-[:MENTIONED_IN]-(a:Article) 
                 RETURN c.id, type(r), p.id, a.url
 
         Question: "Who supplies TSMC?"
-        Cypher: MATCH (supplier)-[r:SUPPLIES_TO|PARTNERS_WITH]-(c:Company)
-                WHERE toLower(c.id) CONTAINS 'tsmc'
+        Resolved entities: Company {{id: 'TSMC'}}
+        Cypher: MATCH (supplier)-[r:SUPPLIES_TO|PARTNERS_WITH]-(c:Company {{id: 'TSMC'}})
                 RETURN labels(supplier), supplier.id, type(r), c.id
 
         Question: "Identify critical supply chain risks."
@@ -90,8 +150,8 @@ class NvidiaSentinelAgent:
                 RETURN e.id, type(r), c.id LIMIT 10
 
         Question: "What is connected to Nvidia?"
-        Cypher: MATCH (c:Company)-[r]-(target) 
-                WHERE toLower(c.id) CONTAINS 'nvidia' 
+        Resolved entities: Company {{id: 'Nvidia'}}
+        Cypher: MATCH (c:Company {{id: 'Nvidia'}})-[r]-(target) 
                 OPTIONAL MATCH (c)-[:MENTIONED_IN]-(a:Article)
                 RETURN c.id, type(r), target.id, labels(target), a.url
 
@@ -103,6 +163,22 @@ class NvidiaSentinelAgent:
             template=cypher_generation_template
         )
 
+        # --- FUSED PLANNING (intent + subject entity + Cypher in one call) ---
+        plan_template = cypher_generation_template.rsplit("Question: {question}", 1)[0] + """
+        Plan the answer to the question below:
+        - intent: 'DATA' if it asks about companies, products, suppliers, relationships, news or graph data;
+          'GENERAL' for hi, hello, thanks or questions about your identity.
+        - entity: the single most important 'Subject' entity for graph visualization (name only).
+        - cypher: the Cypher query for a DATA question (empty for GENERAL).
+
+        Question: {question}"""
+        self.plan_chain = PromptTemplate(
+            input_variables=["schema", "question"],
+            template=plan_template
+        ) | self.llm.with_structured_output(QueryPlan)
+        # Subject entities from recent plans, so the visualization skips its own extraction call
+        self.planned_entities = LRUTTLCache(max_entries=64, ttl_seconds=600)
+
         qa_template = """
         You are a Supply Chain Risk Analyst.
         
@@ -131,13 +207,19 @@ class NvidiaSentinelAgent:
                 verbose=True,
                 cypher_prompt=cypher_prompt,
                 qa_prompt=qa_prompt,
-                allow_dangerous_requests=True,
+                allow_dangerous_requests=True,  # Generated queries run through cypher_guard (read-only, budgeted)
                 return_intermediate_steps=True, 
-                top_k=10
+                top_k=10,
+                exclude_types=[GRAPH_META_LABEL]
             )
         else:
             self.chain = None
 
+        # Check the snapshot's version stamp off the startup path
+        self.schema_refresh_lock = threading.Lock()
+        if self.chain is not None:
+            self._schedule_schema_refresh()
+
     def _validate_env(self):
         required_keys = ["NEO4J_URI", "NEO4J_USERNAME", "NEO4J_PASSWORD", "OPENAI_API_KEY"]
         missing = [key for key in required_keys if not os.getenv(key)]
@@ -146,119 +228,386 @@ class NvidiaSentinelAgent:
 
 
 
+    def _with_entity_hints(self, question):
+        """Appends the exact ids of entities named in the question, so Cypher can use the id index."""
+        mentions = self.entities.find_mentions(question)
+        if not mentions:
+            return question
+        hints = ", ".join(
+            "{} {{id: '{}'}}".format(m["label"], m["id"].replace("\\", "\\\\").replace("'", "\\'"))
+            for m in mentions
+        )
+        return f"{question}\nResolved entities: {hints}"
+
+    def _local_intent(self, question):
+        """Intent from the local router, or None when it is not confident enough."""
+        intent, confidence, source = self.router.route(question)
+        if intent is not None and confidence >= ROUTER_CONFIDENCE:
+            print(f"⚡ Local intent ({source}, {confidence:.2f})")
+            return intent
+        return None
+
     def _classify_intent(self, question):
+        intent = self._local_intent(question)
+        if intent is not None:
+            return intent
         try:
             response = self.intent_chain.invoke({"question": question})
-            return response.content.strip().upper()
+            intent = response.content.strip().upper()
+            self.router.record(question, "GENERAL" if "GENERAL" in intent else "DATA")
+            return intent
         except: return "DATA" # Default to data if unsure
 
-    def ask(self, question):
+    def _schedule_schema_refresh(self, version=None):
+        """Refreshes schema + snapshot in a background thread if the graph version moved on."""
+        if version is not None and version == self.schema_version:
+            return
+        if not self.schema_refresh_lock.acquire(blocking=False):
+            return  # A refresh is already running
+        threading.Thread(target=self._refresh_stale_schema, daemon=True).start()
+
+    def _refresh_stale_schema(self):
+        try:
+            version = read_graph_version(self.graph)
+            if version == self.schema_version:
+                return
+            print(f"🔄 Graph is at version {version}, schema snapshot at {self.schema_version}: refreshing in background...")
+            # The ingester that bumped the version usually stored its schema already
+            if load_schema_snapshot(self.graph, version=version) is None:
+                save_schema_snapshot(self.graph, version)
+            self.chain.graph_schema = construct_schema(
+                self.graph.get_structured_schema, [], [GRAPH_META_LABEL],
+                getattr(self.graph, "_enhanced_schema", False)
+            )
+            self.schema_version = version
+        except Exception as e:
+            print(f"⚠️ Background schema refresh failed: {e}")
+        finally:
+            self.schema_refresh_lock.release()
+
+    def _answer_cache_key(self):
+        """Current graph version; drops every cached answer once an ingest has bumped it."""
+        version = self.graph_version.current() if self.graph_version else None
+        if version != self.cached_version:
+            self.answer_cache.clear()
+            self.cached_version = version
+            if self.chain is not None:
+                self._schedule_schema_refresh(version)
+        return version
+
+    def cache_metrics(self):
+        """Answer cache hits/misses/size/hit_rate plus the graph version it is valid for."""
+        return {**self.answer_cache.stats(), "graph_version": self.cached_version}
+
+    def ask(self, question, on_intent=None):
+        """Blocking variant of ask_stream(): returns {"result", "cypher"}."""
+        for kind, payload in self.ask_stream(question, on_intent):
+            if kind == "done":
+                return payload
+
+    def ask_stream(self, question, on_intent=None):
+        """
+        Streaming answer. Yields ("cypher", query) as soon as the query exists (again when
+        the guard rewrites or a retry replaces it; the last one is what ran), then
+        ("token", text) chunks of the answer, and finally ("done", {"result", "cypher"}).
+        """
         print("\n" + "="*50)
         print(f" Querying: {question}")
         print("="*50)
 
-        # 1. Check Intent
-        intent = self._classify_intent(question)
+        # 0. Answer Cache (keyed by normalized question + graph version)
+        key = (normalize(question), self._answer_cache_key())
+        cached = self.answer_cache.get(key)
+        if cached is not None:
+            print(f"⚡ Answer cache hit ({self.cache_metrics()})")
+            yield "cypher", cached["cypher"]
+            yield "token", cached["result"]
+            yield "done", dict(cached)
+            return
+
+        for kind, payload in self._answer_stream(question, on_intent):
+            if kind == "done" and payload["cypher"] not in ("Error", "Connection Error", "Rejected"):
+                self.answer_cache.put(key, dict(payload))
+            yield kind, payload
+
+    def _plan(self, question):
+        """One structured-output call returning a QueryPlan, or None (callers fall back to the step-by-step path)."""
+        try:
+            plan = self.plan_chain.invoke({
+                "question": self._with_entity_hints(question),
+                "schema": self.chain.graph_schema
+            })
+        except Exception as e:
+            print(f"⚠️ Fused planning failed, using step-by-step path: {e}")
+            return None
+        if plan.entity:
+            self.planned_entities.put(normalize(question), plan.entity)
+        return plan
+
+    def ask_with_graph(self, question):
+        """
+        Runs answer generation and the neighborhood fetch in parallel.
+        Returns (response, graph_data or None).
+        """
+        response, graph_data = None, None
+        for kind, payload in self.stream_with_graph(question):
+            if kind == "done":
+                response = payload
+            elif kind == "graph":
+                graph_data = payload
+        return response, graph_data
+
+    def stream_with_graph(self, question):
+        """
+        ask_stream() events while the neighborhood is fetched in parallel, followed by
+        ("graph", graph_data or None). The visualization is cancelled as soon as the
+        intent turns out to be GENERAL (or the answer failed).
+        """
+        cancel = threading.Event()
+        # Set once planning is over (planned, failed or skipped); the visualization waits on it
+        plan_ready = threading.Event()
+
+        def on_intent(intent):
+            plan_ready.set()
+            if "GENERAL" in intent:
+                cancel.set()
+
+        # Obvious small talk never starts the visualization at all
+        intent, confidence, _ = self.router.route(question)
+        if intent == "GENERAL" and confidence >= ROUTER_CONFIDENCE:
+            cancel.set()
+            graph_future = None
+        else:
+            graph_future = self.executor.submit(self.visualize_query_neighborhood, question, cancel, plan_ready)
+
+        response = None
+        try:
+            for kind, payload in self.ask_stream(question, on_intent):
+                if kind == "done":
+                    response = payload
+                yield kind, payload
+        finally:
+            plan_ready.set()  # Cached answers never reach on_intent
+            if response is None:
+                cancel.set()
+
+        cypher = response["cypher"]
+        no_data = "General Conversation" in cypher or "Error" in cypher or cypher == "Rejected"
+        if graph_future is None or cancel.is_set() or no_data:
+            cancel.set()
+            if graph_future is not None:
+                graph_future.cancel()
+            yield "graph", None
+        else:
+            yield "graph", graph_future.result()
+
+    def _answer_stream(self, question, on_intent=None):
+        # 1. Check Intent (fused mode plans intent, subject and Cypher in the same call)
+        plan, cached = None, None
+        intent = self._local_intent(question)
+        if intent == "DATA" and self.chain is not None:
+            # Cache first: a known DATA question with a cached query needs no planning call
+            cached = self._cached_cypher(question)
+        planned_already = cached is not None and cached[1] is not None
+        if PLANNER_MODE == "fused" and self.chain is not None and intent != "GENERAL" and not planned_already:
+            plan = self._plan(question)
+            if plan is not None and intent is None:
+                intent = plan.intent
+                self.router.record(question, intent)
+        if intent is None:
+            intent = self._classify_intent(question)
         print(f"🧠 Detected Intent: {intent}")
+        if on_intent is not None:
+            on_intent(intent)
 
         if "GENERAL" in intent:
             # Handle Chitchat without DB
-            response = self.llm.invoke(f"You are Nvidia Sentinel, a Supply Chain Intelligence AI. The user says: '{question}'. Respond politely and briefly.")
-            return {
-                "result": response.content,
-                "cypher": "None (General Conversation)"
-            }
+            cypher = "None (General Conversation)"
+            yield "cypher", cypher
+            chunks = []
+            for chunk in self.llm.stream(f"You are Nvidia Sentinel, a Supply Chain Intelligence AI. The user says: '{question}'. Respond politely and briefly."):
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield "token", chunk.content
+            yield "done", {"result": "".join(chunks), "cypher": cypher}
+            return
 
         # 2. Handle Data Query (Existing Logic)
         if self.graph is None:
-            return {
-                "result": "⚠️ I am currently disconnected from the Knowledge Graph. Please check your Neo4j Connection settings.",
-                "cypher": "Connection Error"
-            }
+            result = "⚠️ I am currently disconnected from the Knowledge Graph. Please check your Neo4j Connection settings."
+            yield "cypher", "Connection Error"
+            yield "token", result
+            yield "done", {"result": result, "cypher": "Connection Error"}
+            return
 
         try:
-            response = self.chain.invoke({"query": question})
-            final_answer = response.get("result", "No answer.")
-            
-            steps = response.get("intermediate_steps", [])
-            generated_cypher = steps[0]["query"] if steps else "None"
-            
-            # Print for Debugging
+            planned_cypher = extract_cypher(plan.cypher) if plan is not None and plan.cypher else None
+            try:
+                # Streams ("cypher", ...) as soon as the query is known, before it runs
+                generated_cypher, context = yield from self._query_graph(question, planned_cypher, cached)
+            except CypherRejected as e:
+                print(f"🛑 Cypher rejected: {e}")
+                result = f"🛑 I did not run this query: {e}"
+                yield "cypher", "Rejected"
+                yield "token", result
+                yield "done", {"result": result, "cypher": "Rejected"}
+                return
             print(f"\n📝 Generated Cypher:\n{generated_cypher}")
+
+            chunks = []
+            for chunk in self.chain.qa_chain.stream({"question": question, "context": context}):
+                text = self._text(chunk)
+                if text:
+                    chunks.append(text)
+                    yield "token", text
+            final_answer = "".join(chunks) or "No answer."
+
+            # Print for Debugging
             print("-" * 30)
             print(f"💡 Analyst Output:\n{final_answer}")
             print("-" * 30)
             
-            return {
+            yield "done", {
                 "result": final_answer,
                 "cypher": generated_cypher
             }
             
         except Exception as e:
             print(f"❌ Error: {e}")
-            return {"result": "I encountered an error accessing the data grid.", "cypher": "Error"}
+            yield "done", {"result": "I encountered an error accessing the data grid.", "cypher": "Error"}
             
 
 
-    def visualize_query_neighborhood(self, question):
+    @staticmethod
+    def _text(output):
+        """Chain output as text (runnable chains return str, legacy LLMChains a dict)."""
+        return output if isinstance(output, str) else output.get("text", "")
+
+    def _cypher_cache_key(self, question):
+        """Cache key under (normalized question, schema hash); purges entries of an older schema."""
+        schema_hash = CypherCache.schema_hash(self.chain.graph_schema)
+        if schema_hash != self.cypher_schema_hash:
+            self.cypher_cache.purge_other_schemas(schema_hash)
+            self.cypher_schema_hash = schema_hash
+        return CypherCache.make_key(normalize(question), schema_hash)
+
+    def _cached_cypher(self, question):
+        """(cache key, cached Cypher or None) for a question, entity hints included."""
+        key = self._cypher_cache_key(self._with_entity_hints(question))
+        cypher = self.cypher_cache.get(key)
+        if cypher is not None:
+            print("⚡ Cypher cache hit")
+        return key, cypher
+
+    def _generate_cypher(self, question, use_cache=True):
+        """
+        Question -> Cypher. Generation depends only on the question and the schema text,
+        so results are cached under (normalized question, schema hash).
+        Returns (cypher, cache_key, from_cache).
+        """
+        key = self._cypher_cache_key(question)
+        if use_cache:
+            cached = self.cypher_cache.get(key)
+            if cached is not None:
+                print("⚡ Cypher cache hit")
+                return cached, key, True
+
+        generated = self.chain.cypher_generation_chain.invoke({"question": question, "schema": self.chain.graph_schema})
+        return extract_cypher(self._text(generated)), key, False
+
+    def _run_guarded(self, cypher):
+        """
+        Generated Cypher never runs as-is: it is checked for writes, gets path-length and
+        LIMIT caps, must pass an EXPLAIN row budget, and runs read-only under a timeout.
+        Yields ("cypher", rewritten) before running when the guard changed the query.
+        Returns (cypher as run, rows); raises CypherRejected with a readable reason.
+        """
+        guarded = guard_cypher(cypher, limit=self.chain.top_k)
+        if guarded != cypher.strip():
+            yield "cypher", guarded
+        return guarded, run_read_only(guarded)[: self.chain.top_k]
+
+    def _query_graph(self, question, planned_cypher=None, cached=None):
+        """
+        The first GraphCypherQAChain steps (generate -> query) with a cacheable generation.
+        A Cypher query from the fused plan replaces generation (a cached one still wins).
+        `cached` is a _cached_cypher() result the caller already looked up.
+        Data still comes from the live graph on every call. A generator: yields
+        ("cypher", query) as soon as each query is known (again for a guard rewrite or a
+        regenerated query), then returns (cypher, context rows).
+        """
+        hinted_question = self._with_entity_hints(question)
+        key, cypher = cached or self._cached_cypher(question)
+        from_cache = cypher is not None
+        if not from_cache:
+            cypher = planned_cypher or self._generate_cypher(hinted_question, use_cache=False)[0]
+        yield "cypher", cypher
+        try:
+            cypher, context = yield from self._run_guarded(cypher)
+        except CypherRejected:
+            raise  # Refused on purpose (write, over budget): a regenerated query would not help
+        except Exception:
+            if not from_cache and not planned_cypher:
+                raise
+            # A cached (or planned) query that does not run is dropped and regenerated once
+            if from_cache:
+                self.cypher_cache.discard(key)
+            cypher, key, from_cache = self._generate_cypher(hinted_question, use_cache=False)
+            yield "cypher", cypher
+            cypher, context = yield from self._run_guarded(cypher)
+
+        if not from_cache:
+            self.cypher_cache.put(key, self.cypher_schema_hash, cypher)
+        return cypher, context
+
+    def visualize_query_neighborhood(self, question, cancel=None, plan_ready=None):
         """
         Fetches the immediate graph neighborhood for a visual display.
+        `cancel` (threading.Event) stops the work between steps once it is set.
+        `plan_ready` (threading.Event) is set when the answer's planning step is over;
+        in fused mode the subject entity is taken from that plan instead of extracted.
         """
         if self.graph is None: return None
 
         try:
-            # 1. Identify the Entity
-            entity_name = self.entity_chain.invoke({"question": question}).content.strip()
-            print(f"🕸️ Visualizing Neighborhood for: {entity_name}")
-            
-            # 2. Query the Graph (Safe 2-Hop Expansion)
-            # Strategy: Find central node -> expand 2 layers out WITHOUT filtering the neighbors by name.
-            query = """
-            MATCH (center) WHERE toLower(center.id) CONTAINS toLower($name)
-            WITH center LIMIT 1
-            MATCH path = (center)-[*1..2]-(m)
-            UNWIND relationships(path) as r
-            RETURN startNode(r) as n, type(r) as r_type, endNode(r) as m LIMIT 100
-            """
-            
-            data = self.graph.query(query, params={"name": entity_name})
-            
-            # 3. Format for Streamlit AGraph
-            nodes = set()
-            edges = []
-            
-            for record in data:
-                n = record['n']
-                m = record['m']
-                r_type = record['r_type']
-                
-                # Add Nodes (Use ID as label for simplicity)
-                # Handle both object and dict access for safety
-                def get_lbl(node_obj):
-                    if hasattr(node_obj, 'labels'): return list(node_obj.labels)[0]
-                    return node_obj.get('labels', ['Entity'])[0] if isinstance(node_obj, dict) else "Entity"
-
-                def get_id(node_obj):
-                    if isinstance(node_obj, dict): return node_obj.get('id', "Unknown")
-                    return node_obj.get("id") if "id" in node_obj else str(node_obj)
-
-                n_id = get_id(n)
-                m_id = get_id(m)
-
-                nodes.add((n_id, get_lbl(n)))
-                nodes.add((m_id, get_lbl(m)))
-                
-                # Add Edges
-                edges.append({
-                    "source": n_id,
-                    "target": m_id,
-                    "type": r_type
-                })
+            # 1. Identify the Entity (already known when the question went through the fused planner)
+            # (a question naming exactly one known entity needs no extraction call either)
+            entity_name = self.planned_entities.get(normalize(question))
+            if entity_name is None and plan_ready is not None and PLANNER_MODE == "fused":
+                plan_ready.wait(PLAN_WAIT_SECONDS)
+                if cancel is not None and cancel.is_set():
+                    return None
+                entity_name = self.planned_entities.get(normalize(question))
+            if entity_name is None:
+                mentions = self.entities.find_mentions(question)
+                if len(mentions) == 1:
+                    entity_name = mentions[0]["id"]
+                else:
+                    entity_name = self.entity_chain.invoke({"question": question}).content.strip()
+
+            if cancel is not None and cancel.is_set():
+                return None
+
+            # 2. Resolve it to an exact node (in-memory index, full-text fallback)
+            candidates = [c for c in self.entities.resolve(entity_name, self.graph) if c["label"] in ALLOWED_NODES]
+            if cancel is not None and cancel.is_set():
+                return None
+            if not candidates:
+                print(f"🕸️ No graph entity matches: {entity_name}")
+                return None
+            center = candidates[0]
+            print(f"🕸️ Visualizing Neighborhood for: {center['id']} ({center['label']})")
             
-            return {
-                "nodes": [{"id": n[0], "label": n[0], "group": n[1]} for n in nodes],
-                "edges": edges
-            }
+            # 3. Serve a precomputed snapshot when it matches the current graph version
+            self.neighborhoods.record_query(center["label"], center["id"])
+            version = self.graph_version.current() if self.graph_version else None
+            snapshot = self.neighborhoods.get(center["label"], center["id"], version)
+            if snapshot is not None:
+                print("⚡ Neighborhood snapshot hit")
+                return snapshot
+
+            # 4. Query the Graph: distinct, ranked, budgeted 2-hop neighborhood (see neighborhood.py)
+            return fetch_neighborhood(self.graph, center["label"], center["id"])
 
         except Exception as e:
             print(f"❌ Visual Error: {e}")
@@ -3,18 +3,19 @@ import time
 import base64
 import textwrap
 import os
+import re
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from neo4j import GraphDatabase
-from agent import NvidiaSentinelAgent
+# Only light modules here: the AI stack (agent -> langchain, neo4j) loads in the background
+from intent_router import SUGGESTED_QUESTIONS
 import auth
-try:
-    from streamlit_agraph import agraph, Node, Edge, Config
-except ImportError:
-    st.error("Please install streamlit-agraph: pip install streamlit-agraph")
 
 # --- 1. CONFIGURATION ---
 load_dotenv()
+# Chat rendering window: the latest messages render fully, older ones as collapsed summaries
+CHAT_WINDOW = int(os.getenv("CHAT_WINDOW", "10"))
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "20"))
 st.set_page_config(
     page_title="NVIDIA SENTINEL",
     layout="wide",
@@ -250,9 +251,20 @@ st.markdown("""
 
 # --- 4. BACKEND SETUP ---
 @st.cache_resource
+def start_agent_build():
+    """Imports the AI stack and builds the agent on a background thread, once per process."""
+    def build():
+        from agent import NvidiaSentinelAgent
+        return NvidiaSentinelAgent()
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-build").submit(build)
+
 def get_agent_v16():
-    return NvidiaSentinelAgent()
+    future = start_agent_build()
+    if future.done() and future.exception() is not None:
+        start_agent_build.clear()  # Let the next request retry the build
+    return future.result()
 
+@st.cache_data
 def get_base64_of_bin_file(bin_file):
     try:
         with open(bin_file, 'rb') as f: return base64.b64encode(f.read()).decode()
@@ -284,11 +296,23 @@ def render_header():
     </div>
     """, unsafe_allow_html=True)
 
+def render_report_card(text):
+    return textwrap.dedent(f"""
+    <div class="glass-card">
+        <h4 style="color: #10b981; margin: 0 0 10px 0;">⚡ INTELLIGENCE REPORT</h4>
+        <div style="font-size: 1rem; line-height: 1.6; color: #e0e0e0;">
+            {text}
+        </div>
+    </div>
+    """)
+
 # --- 6. SIDEBAR (History Only) ---
 
 # --- 7. PAGES ---
 
 def login_page():
+    # Warm the agent while the user types credentials
+    start_agent_build()
     img_base64 = get_base64_of_bin_file("nvidia_logo.png")
     
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -319,6 +343,11 @@ def login_page():
                     signup_user(nu, np)
 
 def main_app():
+    try:
+        from streamlit_agraph import agraph, Node, Edge, Config
+    except ImportError:
+        st.error("Please install streamlit-agraph: pip install streamlit-agraph")
+
     render_header()
     
     # --- SIDEBAR CONTENT (Inside function to avoid rendering on login) ---
@@ -358,12 +387,6 @@ def main_app():
         
         st.markdown("---")
         st.markdown("### 🚀 QUICK INTEL")
-        SUGGESTED_QUESTIONS = [
-            "Who supplies TSMC?",
-            "Identify critical supply chain risks.",
-            "What is connected to Nvidia?",
-            "What is the relationship between OpenAI and Microsoft?"
-        ]
         for q in SUGGESTED_QUESTIONS:
             if st.button(q, use_container_width=True):
                 st.session_state["suggested_input"] = q
@@ -376,31 +399,58 @@ def main_app():
             if st.button("🚪 Logout", use_container_width=True):
                 logout_user()
 
-    # --- MAIN CHAT RENDER ---
-    current_messages = st.session_state.sessions.get(st.session_state.current_id, [])
-    
-    for i, message in enumerate(current_messages):
+    # --- MAIN CHAT RENDER (windowed) ---
+    sid = st.session_state.current_id
+    current_messages = st.session_state.sessions.get(sid, [])
+    history_pages = st.session_state.setdefault("history_pages", {})
+
+    full_start = max(0, len(current_messages) - CHAT_WINDOW)
+    summary_start = max(0, full_start - history_pages.get(sid, 0) * CHAT_PAGE_SIZE)
+    if summary_start > 0:
+        if st.button(f"⬆ Show earlier messages ({summary_start} hidden)", use_container_width=True):
+            history_pages[sid] = history_pages.get(sid, 0) + 1
+            st.rerun()
+
+    def render_graph(i, g_data):
+        nodes = [Node(id=n["id"], label=n["label"], size=15, color="#10b981") for n in g_data["nodes"]]
+        edges = [Edge(source=e["source"], target=e["target"], type="CURVE_SMOOTH") for e in g_data["edges"]]
+        # Fix for DuplicateID: Unique height per instance
+        config = Config(width="100%", height=400+i, directed=True, nodeHighlightBehavior=True, highlightColor="#F7A7A6", collapsible=False)
+        agraph(nodes=nodes, edges=edges, config=config)
+
+    def render_assistant(i, message, is_last, collapsed=False):
+        content = message["content"]
+        if is_last: content = content.replace('class="glass-card"', 'class="glass-card animate-new"')
+
+        st.markdown(content, unsafe_allow_html=True)
+        if "cypher" in message and message["cypher"]:
+            if collapsed:  # Already inside the summary expander (Streamlit cannot nest them)
+                st.code(message["cypher"], language="cypher")
+            else:
+                with st.expander("▶ VIEW SOURCE LOGIC"): 
+                    st.code(message["cypher"], language="cypher")
+
+        if "graph_data" in message and message["graph_data"]:
+            # Only the newest graph renders by itself; past ones load on demand
+            if is_last:
+                with st.expander("🕸️ NEURAL GRID", expanded=True):
+                    render_graph(i, message["graph_data"])
+            elif st.toggle("🕸️ NEURAL GRID", key=f"grid_{sid}_{i}"):
+                render_graph(i, message["graph_data"])
+
+    for i in range(summary_start, len(current_messages)):
+        message = current_messages[i]
         with st.chat_message(message["role"]):
             if message["role"] == "user":
                 st.markdown(message["content"])
+            elif i < full_start:
+                # Collapsed summary: plain-text preview of the report, full card inside
+                preview = " ".join(re.sub(r"<[^>]+>", " ", message["content"]).split())
+                preview = preview.replace("⚡ INTELLIGENCE REPORT", "").strip()
+                with st.expander(f"⚡ {preview[:120]}{'…' if len(preview) > 120 else ''}"):
+                    render_assistant(i, message, is_last=False, collapsed=True)
             else:
-                is_last = (i == len(current_messages) - 1)
-                content = message["content"]
-                if is_last: content = content.replace('class="glass-card"', 'class="glass-card animate-new"')
-                
-                st.markdown(content, unsafe_allow_html=True)
-                if "cypher" in message and message["cypher"]:
-                    with st.expander("▶ VIEW SOURCE LOGIC"): 
-                        st.code(message["cypher"], language="cypher")
-                
-                if "graph_data" in message and message["graph_data"]:
-                    with st.expander("🕸️ NEURAL GRID", expanded=True):
-                        g_data = message["graph_data"]
-                        nodes = [Node(id=n["id"], label=n["label"], size=15, color="#10b981") for n in g_data["nodes"]]
-                        edges = [Edge(source=e["source"], target=e["target"], type="CURVE_SMOOTH") for e in g_data["edges"]]
-                        # Fix for DuplicateID: Unique height per instance
-                        config = Config(width="100%", height=400+i, directed=True, nodeHighlightBehavior=True, highlightColor="#F7A7A6", collapsible=False)
-                        agraph(nodes=nodes, edges=edges, config=config)
+                render_assistant(i, message, is_last=(i == len(current_messages) - 1))
 
     # Input
     if prompt := (st.session_state.get("suggested_input") or st.chat_input("Query the Supply Chain...")):
@@ -411,28 +461,35 @@ def main_app():
              
         st.session_state.sessions[st.session_state.current_id].append({"role": "user", "content": prompt})
         
-        with st.spinner("🔍 Analyzing..."):
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        # Stream into the card: Cypher as soon as it exists, then the answer token by token
+        with st.chat_message("assistant"):
+            card = st.empty()
+            logic = st.empty()
+            card.markdown(render_report_card("🔍 Analyzing..."), unsafe_allow_html=True)
             try:
                 agent = get_agent_v16()
-                response_data = agent.ask(prompt)
-                
-                final_html_card = textwrap.dedent(f"""
-                <div class="glass-card">
-                    <h4 style="color: #10b981; margin: 0 0 10px 0;">⚡ INTELLIGENCE REPORT</h4>
-                    <div style="font-size: 1rem; line-height: 1.6; color: #e0e0e0;">
-                        {response_data['result']}
-                    </div>
-                </div>
-                """)
-                
-                # Only visualize if it's a DATA query
-                graph_data = None
-                if "General Conversation" not in response_data['cypher'] and "Error" not in response_data['cypher']:
-                    graph_data = agent.visualize_query_neighborhood(prompt)
+                response_data, graph_data, streamed = None, None, ""
+                # Answer + neighborhood in parallel (visualization is skipped for general chat)
+                for kind, payload in agent.stream_with_graph(prompt):
+                    if kind == "cypher":
+                        with logic.container():
+                            with st.expander("▶ VIEW SOURCE LOGIC"):
+                                st.code(payload, language="cypher")
+                    elif kind == "token":
+                        streamed += payload
+                        card.markdown(render_report_card(streamed + " ▌"), unsafe_allow_html=True)
+                    elif kind == "done":
+                        response_data = payload
+                        card.markdown(render_report_card(response_data['result']), unsafe_allow_html=True)
+                    elif kind == "graph":
+                        graph_data = payload
 
                 st.session_state.sessions[st.session_state.current_id].append({
                     "role": "assistant", 
-                    "content": final_html_card,
+                    "content": render_report_card(response_data['result']),
                     "cypher": response_data['cypher'],
                     "graph_data": graph_data
                 })
@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+EXTRACTION_CACHE_FILE = os.getenv("EXTRACTION_CACHE_FILE", ".extraction_cache.sqlite")
+EXTRACTION_CACHE_MAX_MB = float(os.getenv("EXTRACTION_CACHE_MAX_MB", "200"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+CYPHER_CACHE_FILE = os.getenv("CYPHER_CACHE_FILE", ".cypher_cache.sqlite")
+CYPHER_CACHE_SIZE = int(os.getenv("CYPHER_CACHE_SIZE", "5000"))
+
+
+class ExtractionCache:
+    """
+    On-disk cache of LLMGraphTransformer output (nodes + relationships) per article.
+    The key covers the article text, the allowed schema and the model name, so any
+    change to those forces a fresh extraction. Least recently used entries are
+    evicted once the stored payloads exceed max_mb.
+    Safe to share between extraction worker threads.
+    """
+    def __init__(self, path=EXTRACTION_CACHE_FILE, max_mb=EXTRACTION_CACHE_MAX_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS extractions_lru ON extractions (last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(content, allowed_nodes, allowed_relationships, model_name):
+        material = json.dumps(
+            [content, sorted(allowed_nodes), sorted(allowed_relationships), model_name]
+        )
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT payload FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE extractions SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, payload):
+        data = json.dumps(payload)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, payload, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time())
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM extractions ORDER BY last_used ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM extractions WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"Extraction cache over {self.max_bytes} bytes: evicted {evicted} entries.")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class LRUTTLCache:
+    """
+    Bounded in-memory LRU with per-entry time-to-live and hit/miss counters.
+    Thread-safe (Streamlit serves several sessions from one cached agent).
+    """
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class CypherCache:
+    """
+    Persistent question -> Cypher mapping. Entries remember the hash of the schema text
+    they were generated against; a schema change makes them unreachable and they are
+    purged on the next start. Keeps at most max_entries (least recently used go first).
+    """
+    def __init__(self, path=CYPHER_CACHE_FILE, max_entries=CYPHER_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cypher (
+                key TEXT PRIMARY KEY,
+                schema_hash TEXT NOT NULL,
+                cypher TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def schema_hash(schema):
+        return hashlib.sha256(schema.encode()).hexdigest()
+
+    @staticmethod
+    def make_key(normalized_question, schema_hash):
+        return hashlib.sha256(f"{schema_hash}\n{normalized_question}".encode()).hexdigest()
+
+    def purge_other_schemas(self, schema_hash):
+        with self.lock:
+            deleted = self.conn.execute(
+                "DELETE FROM cypher WHERE schema_hash != ?", (schema_hash,)
+            ).rowcount
+            self.conn.commit()
+        if deleted:
+            logger.info(f"Cypher cache: schema changed, dropped {deleted} entries.")
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT cypher FROM cypher WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE cypher SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return row[0]
+
+    def put(self, key, schema_hash, cypher):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cypher (key, schema_hash, cypher, last_used) VALUES (?, ?, ?, ?)",
+                (key, schema_hash, cypher, time.time())
+            )
+            self.conn.execute(
+                """
+                DELETE FROM cypher WHERE key IN (
+                    SELECT key FROM cypher ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+            self.conn.commit()
+
+    def discard(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM cypher WHERE key = ?", (key,))
+            self.conn.commit()
@@ -0,0 +1,150 @@
+import os
+import re
+import logging
+
+from neo4j import Query
+from neo4j.exceptions import ClientError
+
+from graph_db import session
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+# Largest row estimate any operator of an EXPLAIN plan may have
+CYPHER_MAX_ESTIMATED_ROWS = float(os.getenv("CYPHER_MAX_ESTIMATED_ROWS", "100000"))
+# Upper bound written into every variable-length pattern ([*], [*2..], [:T*1..9])
+CYPHER_MAX_HOPS = int(os.getenv("CYPHER_MAX_HOPS", "3"))
+# Server-side transaction timeout for generated queries
+CYPHER_TIMEOUT_SECONDS = float(os.getenv("CYPHER_TIMEOUT_SECONDS", "10"))
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`")
+# Names that can never start a clause: n.set / {.delete} properties, AS create aliases,
+# :Set labels and types, (set / [remove pattern variables, {merge: 1} map keys
+_NON_CLAUSE_NAMES = re.compile(
+    r"(?:\b\w+\s*)?\.\s*\w+|\bAS\s+\w+|:\s*\w+|[(\[]\s*\w+|[{,]\s*\w+\s*:",
+    re.IGNORECASE
+)
+_WRITE_CLAUSE = re.compile(
+    r"\b(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|FOREACH|LOAD\s+CSV|GRANT|DENY|REVOKE)\b",
+    re.IGNORECASE
+)
+_WRITE_PROCEDURE = re.compile(
+    r"\bCALL\s+(apoc\.(create|merge|refactor|periodic|load|export|trigger|atomic)|db\.create|dbms\.)",
+    re.IGNORECASE
+)
+# [*], [r*2..], [:A|B*..5 {since: 2020}] -> (prefix, low, "..", high)
+_VAR_LENGTH = re.compile(
+    r"(\[\s*\w*\s*(?::\s*[\w|:`!&]+)?\s*)\*\s*(\d*)\s*(?:(\.\.)\s*(\d*))?(?=\s*(?:\{[^}]*\}\s*)?\])"
+)
+_RETURN = re.compile(r"\bRETURN\b", re.IGNORECASE)
+# Any trailing LIMIT: an integer literal gets capped, a $parameter or expression is kept
+_LIMIT = re.compile(r"\bLIMIT\s+(\S.*?)\s*;?\s*$", re.IGNORECASE | re.DOTALL)
+
+
+class CypherRejected(Exception):
+    """A generated query the guard refuses to run. str() is a user-readable reason."""
+
+
+def _without_literals(cypher):
+    return _STRING_LITERAL.sub("''", cypher)
+
+
+def check_read_only(cypher):
+    cypher = _without_literals(cypher)
+    # Procedure names keep their dots; clauses are matched with non-clause names removed
+    match = _WRITE_PROCEDURE.search(cypher) or _WRITE_CLAUSE.search(_NON_CLAUSE_NAMES.sub(" ", cypher))
+    if match:
+        raise CypherRejected(
+            f"The generated query tries to modify the graph ({match.group(0).strip().upper()}); "
+            f"only read queries are allowed."
+        )
+
+
+def cap_path_length(cypher, max_hops=CYPHER_MAX_HOPS):
+    """Gives every variable-length relationship an upper bound of at most max_hops."""
+    def cap(match):
+        prefix, low, dots, high = match.groups()
+        exact = bool(low) and not dots
+        low = int(low) if low else 1
+        if not dots:
+            # [*] means 1..unbounded, [*3] means exactly 3
+            high = low if exact else max_hops
+        else:
+            high = int(high) if high else max_hops
+        high = min(high, max_hops)
+        if low > high:
+            raise CypherRejected(
+                f"The generated query needs paths of at least {low} hops; the limit is {max_hops}."
+            )
+        return f"{prefix}*{low}..{high}"
+    return _VAR_LENGTH.sub(cap, cypher)
+
+
+def cap_limit(cypher, limit):
+    """Makes the final RETURN end in LIMIT <= limit."""
+    cypher = cypher.strip().rstrip(";")
+    returns = list(_RETURN.finditer(cypher))
+    if not returns:
+        return cypher
+    match = _LIMIT.search(cypher, returns[-1].end())
+    if match is None:
+        return f"{cypher}\nLIMIT {limit}"
+    if match.group(1).isdigit() and int(match.group(1)) > limit:
+        return f"{cypher[:match.start()]}LIMIT {limit}"
+    return cypher
+
+
+def _max_estimated_rows(plan):
+    rows = plan.get("args", {}).get("EstimatedRows", 0)
+    return max([rows] + [_max_estimated_rows(child) for child in plan.get("children", [])])
+
+
+def estimate_rows(cypher, params=None):
+    """Largest EstimatedRows of any operator in the EXPLAIN plan (the query is not executed)."""
+    with session() as s:
+        summary = s.run(f"EXPLAIN {cypher}", params or {}).consume()
+    return _max_estimated_rows(summary.plan or {})
+
+
+def guard_cypher(cypher, limit, max_rows=CYPHER_MAX_ESTIMATED_ROWS, max_hops=CYPHER_MAX_HOPS):
+    """
+    Read-only check, path-length and LIMIT caps, then an EXPLAIN cost check.
+    Plans over the row budget get their path caps tightened one hop at a time
+    before being rejected. Returns the rewritten query or raises CypherRejected.
+    """
+    check_read_only(cypher)
+    for hops in range(max_hops, 0, -1):
+        try:
+            capped = cap_path_length(cypher, hops)
+        except CypherRejected:
+            if hops == max_hops:
+                raise
+            break  # Tightening hit the query's minimum path length: the row budget is the reason
+        guarded = cap_limit(capped, limit)
+        estimate = estimate_rows(guarded)
+        if estimate <= max_rows:
+            if guarded != cypher.strip():
+                logger.info(f"Cypher guard rewrote query (max {hops} hops, LIMIT {limit}).")
+            return guarded
+        if not _VAR_LENGTH.search(cypher):
+            break
+    raise CypherRejected(
+        f"The generated query would touch about {int(estimate):,} rows (budget {int(max_rows):,}). "
+        f"Try naming a specific company, product or relationship."
+    )
+
+
+def run_read_only(cypher, params=None, timeout=CYPHER_TIMEOUT_SECONDS):
+    """Runs a query in a read transaction with a server-side timeout. Returns a list of dicts."""
+    def work(tx):
+        return [record.data() for record in tx.run(Query(cypher, timeout=timeout), params or {})]
+
+    try:
+        with session() as s:
+            return s.execute_read(work)
+    except ClientError as e:
+        if "TransactionTimedOut" in (e.code or "") or "timeout" in (e.code or "").lower():
+            raise CypherRejected(
+                f"The query ran longer than {timeout:g}s and was stopped. Try a narrower question."
+            ) from e
+        raise
@@ -1,29 +1,29 @@
-import os
-from dotenv import load_dotenv
-from langchain_neo4j import Neo4jGraph
+from entity_resolution import EntityIndex
+from graph_db import get_graph
 
-load_dotenv()
-
-graph = Neo4jGraph(
-    url=os.getenv("NEO4J_URI"),
-    username=os.getenv("NEO4J_USERNAME"),
-    password=os.getenv("NEO4J_PASSWORD")
-)
+graph = get_graph()
 
 print("\n🔍 INSPECTING TSMC CONNECTIONS...")
 
-# Find ANYTHING connected to TSMC
-query = """
-MATCH (n)-[r]-(target)
-WHERE toLower(n.id) CONTAINS 'tsmc'
-RETURN type(r) as Relationship, labels(target) as Type, target.id as Name
-LIMIT 20
-"""
+# Resolve TSMC (and its aliases, e.g. 'Taiwan Semiconductor') to exact node ids
+index = EntityIndex()
+if not index.entities:
+    index.rebuild(graph)
+candidates = index.resolve("TSMC", graph)
+print(f"Resolved to: {[(c['label'], c['id']) for c in candidates]}")
 
-results = graph.query(query)
+# Find ANYTHING connected to TSMC (indexed label + id lookups)
+results = []
+for c in candidates:
+    query = f"""
+    MATCH (n:{c['label']} {{id: $id}})-[r]-(target)
+    RETURN type(r) as Relationship, labels(target) as Type, target.id as Name
+    LIMIT 20
+    """
+    results += graph.query(query, params={"id": c["id"]})
 
 if not results:
-    print("❌ No connections found for TSMC. (Maybe it's named 'Taiwan Semiconductor'?)")
+    print("❌ No connections found for TSMC. (Add its spelling to entity_aliases.json?)")
 else:
     for row in results:
         print(f"TSMC --[{row['Relationship']}]-- {row['Name']} ({row['Type']})")
\ No newline at end of file
@@ -0,0 +1,77 @@
+import os
+import json
+
+# External keyword dictionaries: {"Label": ["Term", ...]}
+ENTITY_DICTIONARY_FILE = os.getenv("ENTITY_DICTIONARY_FILE", "entity_dictionaries.json")
+
+
+class EntityMatcher:
+    """
+    Aho-Corasick automaton over every dictionary term (case-insensitive).
+    Built once; find() then scans a text in a single linear pass no matter
+    how many terms the dictionaries hold. Matches must sit on word boundaries
+    (a plural 's' is allowed), so 'Meta' does not fire inside 'metadata'
+    while 'Delays' still counts as 'Delay'.
+    """
+    def __init__(self, dictionaries):
+        # Trie: goto[state] maps char -> state; out[state] lists (length, (label, term))
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for label, terms in dictionaries.items():
+            for term in terms:
+                self._add(term.lower(), (label, term))
+        self._build()
+
+    @classmethod
+    def from_file(cls, path=ENTITY_DICTIONARY_FILE):
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def _add(self, key, entity):
+        if not key:
+            return
+        state = 0
+        for ch in key:
+            if ch not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[state][ch] = len(self.goto) - 1
+            state = self.goto[state][ch]
+        self.out[state].append((len(key), entity))
+
+    def _build(self):
+        # Breadth-first: fail links point to the longest proper suffix in the trie
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    @staticmethod
+    def _is_boundary(text, i):
+        return i >= len(text) or not text[i].isalnum()
+
+    def find(self, text):
+        """Returns the set of (label, term) found in text."""
+        text = text.lower()
+        found = set()
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for length, entity in self.out[state]:
+                start = i - length + 1
+                before_ok = start == 0 or not text[start - 1].isalnum()
+                after_ok = self._is_boundary(text, i + 1) or (
+                    text[i + 1] == "s" and self._is_boundary(text, i + 2)
+                )
+                if before_ok and after_ok:
+                    found.add(entity)
+        return found
@@ -0,0 +1,225 @@
+import os
+import re
+import bisect
+import difflib
+import logging
+import threading
+
+from entity_matcher import EntityMatcher
+from graph_schema import ALLOWED_NODES
+from state_files import read_json, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Snapshot of every entity id, rebuilt by the ingesters and reloaded by the agent
+ENTITY_INDEX_FILE = os.getenv("ENTITY_INDEX_FILE", ".entity_index.json")
+FULLTEXT_INDEX = "entity_id_fulltext"
+
+# Canonical id -> known aliases; extracted names are rewritten to the canonical id before writing
+ENTITY_ALIAS_FILE = os.getenv("ENTITY_ALIAS_FILE", "entity_aliases.json")
+# Optional string-similarity matching against known ids (e.g. 0.92); unset = exact/alias only
+ENTITY_FUZZY_CUTOFF = float(os.getenv("ENTITY_FUZZY_CUTOFF", "0")) or None
+
+# Legal-form words ignored when comparing company names
+_CORPORATE_SUFFIXES = {"inc", "corp", "corporation", "co", "ltd", "limited", "plc", "llc", "holdings", "company"}
+
+_LUCENE_SPECIAL = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+
+def normalize(name):
+    """Lowercase, strip punctuation and collapse whitespace: 'Taiwan Semiconductor, Inc.' -> 'taiwan semiconductor inc'."""
+    return " ".join(re.sub(r"[^\w\s]", " ", name.lower()).split())
+
+
+def canonical_key(name):
+    """normalize() without trailing legal forms: 'NVIDIA Corp.' and 'Nvidia' share the key 'nvidia'."""
+    tokens = normalize(name).split()
+    while len(tokens) > 1 and tokens[-1] in _CORPORATE_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+class Canonicalizer:
+    """
+    Maps entity name variants to one canonical id at ingest time, so the graph never
+    splits 'TSMC' / 'Taiwan Semiconductor' into separate neighborhoods.
+    Resolution order: alias table, ids already in the graph (`known_ids`), optional
+    fuzzy match; an unseen name becomes canonical itself for the rest of the run.
+    """
+    def __init__(self, path=ENTITY_ALIAS_FILE, known_ids=(), fuzzy_cutoff=ENTITY_FUZZY_CUTOFF):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.canonical_by_key = {}
+        self.aliases = read_json(path, {}, "alias table")
+        for entity_id in known_ids:
+            self.canonical_by_key.setdefault(canonical_key(entity_id), entity_id)
+        # The alias table wins over whatever spelling the graph happens to hold
+        for canonical, aliases in self.aliases.items():
+            for name in [canonical, *aliases]:
+                self.canonical_by_key[canonical_key(name)] = canonical
+
+    def aliases_of(self, canonical):
+        return self.aliases.get(canonical, [])
+
+    def canonical(self, name, learn=True):
+        """Canonical id for `name`. With learn=False (read paths) unseen names are not remembered."""
+        key = canonical_key(name)
+        if not key:
+            return name
+        if key in self.canonical_by_key:
+            return self.canonical_by_key[key]
+        if self.fuzzy_cutoff:
+            close = difflib.get_close_matches(key, self.canonical_by_key.keys(), n=1, cutoff=self.fuzzy_cutoff)
+            if close:
+                canonical = self.canonical_by_key[close[0]]
+                if learn:
+                    logger.info(f"Fuzzy canonicalization: {name!r} -> {canonical!r}")
+                    self.canonical_by_key[key] = canonical
+                return canonical
+        if learn:
+            self.canonical_by_key[key] = name
+        return name
+
+    def canonicalize_payload(self, payload):
+        """Rewrites node and relationship ids of one extraction payload; merges nodes that collapse together."""
+        nodes, seen = [], set()
+        for node in payload["nodes"]:
+            node = {**node, "id": self.canonical(node["id"])}
+            if (node["type"], node["id"]) not in seen:
+                seen.add((node["type"], node["id"]))
+                nodes.append(node)
+        rels = [
+            {**rel, "source_id": self.canonical(rel["source_id"]), "target_id": self.canonical(rel["target_id"])}
+            for rel in payload["rels"]
+        ]
+        return {**payload, "nodes": nodes, "rels": rels}
+
+
+class EntityIndex:
+    """
+    In-memory resolver from a user's entity string to candidate (label, id) nodes.
+    Lookups are dict/bisect operations (exact name, then prefix, then whole-word),
+    so no traversal has to start with an unlabeled CONTAINS scan. Anything the local
+    snapshot misses falls back to the Neo4j full-text index.
+    """
+    def __init__(self, path=ENTITY_INDEX_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.loaded_mtime = None
+        self.aliases = Canonicalizer()
+        self._build([])
+        self.reload_if_changed()
+
+    def _build(self, entities):
+        by_key, by_token = {}, {}
+        for entity in entities:
+            key = canonical_key(entity["id"])
+            if not key:
+                continue
+            by_key.setdefault(key, []).append(entity)
+            for token in key.split():
+                by_token.setdefault(token, []).append(entity)
+        self.entities = entities
+        self.by_key = by_key
+        self.by_token = by_token
+        self.keys = sorted(by_key)
+        self.matcher = None  # Built lazily by find_mentions()
+
+    def reload_if_changed(self):
+        """Picks up a snapshot rewritten by an ingestion run (cheap stat() when unchanged)."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.loaded_mtime:
+            return
+        entities = read_json(self.path, None, "entity index")
+        if entities is None:
+            return
+        with self.lock:
+            self._build(entities)
+            self.loaded_mtime = mtime
+
+    def rebuild(self, graph):
+        """Re-reads every entity id from the graph and rewrites the snapshot. Run after ingestion."""
+        query = """
+        MATCH (n) WHERE n.id IS NOT NULL AND any(l IN labels(n) WHERE l IN $labels)
+        RETURN n.id AS id, [l IN labels(n) WHERE l IN $labels][0] AS label
+        """
+        entities = [
+            {"id": row["id"], "label": row["label"]}
+            for row in graph.query(query, params={"labels": ALLOWED_NODES})
+            if isinstance(row["id"], str)
+        ]
+        write_json_atomic(self.path, entities)
+        with self.lock:
+            self._build(entities)
+            self.loaded_mtime = os.path.getmtime(self.path)
+        logger.info(f"Entity index rebuilt: {len(entities)} entities.")
+        return len(entities)
+
+    def lookup(self, name, limit=5):
+        """Local-only resolution, best candidates first. Known aliases resolve to their canonical id."""
+        key = canonical_key(self.aliases.canonical(name, learn=False))
+        if not key:
+            return []
+        with self.lock:
+            candidates = list(self.by_key.get(key, []))
+
+            # Prefix: 'nvid' -> 'nvidia', 'taiwan semi' -> 'taiwan semiconductor'
+            i = bisect.bisect_left(self.keys, key)
+            while i < len(self.keys) and len(candidates) < limit and self.keys[i].startswith(key):
+                candidates.extend(self.by_key[self.keys[i]])
+                i += 1
+
+            # Whole-word: 'tsmc' -> 'tsmc arizona'
+            if len(candidates) < limit:
+                for token in key.split():
+                    candidates.extend(self.by_token.get(token, []))
+
+        seen, result = set(), []
+        for entity in candidates:
+            marker = (entity["label"], entity["id"])
+            if marker not in seen:
+                seen.add(marker)
+                result.append(entity)
+        return result[:limit]
+
+    def resolve(self, name, graph=None, limit=5):
+        """Local lookup first; the full-text index only when the snapshot has nothing."""
+        self.reload_if_changed()
+        candidates = self.lookup(name, limit)
+        if candidates or graph is None:
+            return candidates
+
+        # Fuzzy match on every word of the name
+        terms = [_LUCENE_SPECIAL.sub(r"\\\1", t) + "~" for t in normalize(name).split()]
+        if not terms:
+            return []
+        try:
+            rows = graph.query(
+                f"""
+                CALL db.index.fulltext.queryNodes('{FULLTEXT_INDEX}', $q) YIELD node, score
+                RETURN node.id AS id, [l IN labels(node) WHERE l IN $labels][0] AS label
+                LIMIT $limit
+                """,
+                params={"q": " ".join(terms), "labels": ALLOWED_NODES, "limit": limit}
+            )
+            return [{"id": row["id"], "label": row["label"]} for row in rows]
+        except Exception as e:
+            logger.warning(f"Full-text entity lookup failed: {e}")
+            return []
+
+    def find_mentions(self, text):
+        """Every known entity named in `text`, found in one pass (e.g. to pin exact ids in a prompt)."""
+        self.reload_if_changed()
+        with self.lock:
+            if self.matcher is None:
+                dictionaries = {}
+                for entity in self.entities:
+                    terms = dictionaries.setdefault(entity["label"], [])
+                    terms.append(entity["id"])
+                    terms.extend(self.aliases.aliases_of(entity["id"]))
+                self.matcher = EntityMatcher(dictionaries)
+            matcher = self.matcher
+        mentions = {(label, self.aliases.canonical(term, learn=False)) for label, term in matcher.find(text)}
+        return [{"label": label, "id": entity_id} for label, entity_id in sorted(mentions)]
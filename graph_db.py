@@ -0,0 +1,130 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from neo4j import GraphDatabase, Query, RoutingControl, READ_ACCESS, WRITE_ACCESS
+from langchain_neo4j import Neo4jGraph
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+load_dotenv()
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+# Seconds a caller may wait for a free pooled connection before failing
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30"))
+# TCP keepalive plus a liveness ping for connections idle longer than this many seconds
+NEO4J_KEEP_ALIVE = os.getenv("NEO4J_KEEP_ALIVE", "true").lower() == "true"
+NEO4J_LIVENESS_CHECK = float(os.getenv("NEO4J_LIVENESS_CHECK", "30"))
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
+# Connections opened by warmup() so the first requests skip the TCP/TLS/auth handshake
+NEO4J_WARMUP_CONNECTIONS = int(os.getenv("NEO4J_WARMUP_CONNECTIONS", "4"))
+
+_lock = threading.Lock()
+_driver = None
+_graphs = {}
+
+
+def get_driver():
+    """The process-wide pooled driver, created on first use."""
+    global _driver
+    with _lock:
+        if _driver is None:
+            _driver = GraphDatabase.driver(
+                os.getenv("NEO4J_URI"),
+                auth=(os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD")),
+                max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+                connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+                keep_alive=NEO4J_KEEP_ALIVE,
+                liveness_check_timeout=NEO4J_LIVENESS_CHECK,
+                max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME
+            )
+            atexit.register(close_driver)
+        return _driver
+
+
+def close_driver():
+    global _driver
+    with _lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+            _graphs.clear()
+
+
+def session(write=False):
+    """A session routed to the writer (write=True) or to any reader of the cluster."""
+    return get_driver().session(
+        database=NEO4J_DATABASE,
+        default_access_mode=WRITE_ACCESS if write else READ_ACCESS
+    )
+
+
+def warmup(connections=NEO4J_WARMUP_CONNECTIONS, write=False):
+    """Verifies connectivity and fills the pool with `connections` open connections."""
+    start = time.perf_counter()
+    get_driver().verify_connectivity()
+
+    def ping(_):
+        with session(write) as s:
+            s.run("RETURN 1").consume()
+
+    # Concurrent sessions force distinct connections; they stay pooled afterwards
+    with ThreadPoolExecutor(max_workers=max(1, connections)) as pool:
+        list(pool.map(ping, range(max(1, connections))))
+    elapsed = time.perf_counter() - start
+    logger.info(f"Neo4j pool warmed: {connections} connections in {elapsed:.2f}s.")
+    return elapsed
+
+
+class PooledGraph(Neo4jGraph):
+    """
+    Neo4jGraph on the shared driver. Every query() is a driver.execute_query()
+    (managed transaction with retries) routed to readers for the agent and to
+    the writer for the ETL.
+    """
+    def __init__(self, write=False):
+        # Neo4jGraph.__init__ would open and verify a driver of its own; set its
+        # attributes on the shared pool instead (warmup() verifies connectivity)
+        self._driver = get_driver()
+        self._database = NEO4J_DATABASE
+        self.timeout = None
+        self.sanitize = False
+        self._enhanced_schema = False
+        self.schema = ""
+        self.structured_schema = {}
+        self.access_mode = WRITE_ACCESS if write else READ_ACCESS
+        self.routing = RoutingControl.WRITE if write else RoutingControl.READ
+
+    def query(self, query, params={}, session_params={}):
+        if session_params or self.sanitize:
+            # Explicit session settings (e.g. CALL ... IN TRANSACTIONS) or sanitized
+            # results: Neo4jGraph's own path
+            session_params = {"default_access_mode": self.access_mode, **session_params}
+            return super().query(query, params=params, session_params=session_params)
+        records, _, _ = self._driver.execute_query(
+            Query(query, timeout=self.timeout),
+            params,
+            database_=self._database,
+            routing_=self.routing
+        )
+        return [record.data() for record in records]
+
+    def close(self):
+        # The driver is shared; close_driver() ends it at exit
+        pass
+
+
+def get_graph(write=False):
+    """One PooledGraph per access mode and process."""
+    with _lock:
+        graph = _graphs.get(write)
+    if graph is None:
+        graph = PooledGraph(write)
+        with _lock:
+            graph = _graphs.setdefault(write, graph)
+    return graph
@@ -0,0 +1,127 @@
+import os
+import logging
+
+from state_files import read_json, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Introspected schema text (what Cypher generation sees) + the graph version it describes
+SCHEMA_SNAPSHOT_FILE = os.getenv("SCHEMA_SNAPSHOT_FILE", ".graph_schema.json")
+
+# Strict Schema Definition (shared by the ETL, the crawler and the agent)
+ALLOWED_NODES = ["Company", "Person", "Location", "Event", "Product"]
+ALLOWED_RELATIONSHIPS = [
+    "SUPPLIES_TO", "COMPETES_WITH", "LOCATED_IN",
+    "AFFECTS", "HAS_CEO", "ANNOUNCED", "PARTNERS_WITH"
+]
+
+
+def _schema_statements():
+    """(name, kind, label, property, Cypher) for every constraint/index the graph needs."""
+    statements = [
+        ("article_url", "constraint", "Article", "url",
+         "CREATE CONSTRAINT article_url IF NOT EXISTS FOR (a:Article) REQUIRE a.url IS UNIQUE"),
+        ("article_date", "index", "Article", "processed_at",
+         "CREATE INDEX article_date IF NOT EXISTS FOR (a:Article) ON (a.processed_at)"),
+        # Fallback for entity names the agent's local EntityIndex cannot resolve
+        ("entity_id_fulltext", "index", None, "id",
+         f"CREATE FULLTEXT INDEX entity_id_fulltext IF NOT EXISTS "
+         f"FOR (n:{'|'.join(ALLOWED_NODES)}) ON EACH [n.id]"),
+    ]
+    for label in ALLOWED_NODES:
+        name = f"{label.lower()}_id"
+        statements.append((
+            name, "constraint", label, "id",
+            f"CREATE CONSTRAINT {name} IF NOT EXISTS FOR (n:{label}) REQUIRE n.id IS UNIQUE"
+        ))
+    return statements
+
+
+def find_duplicates(graph, label, prop, limit=20):
+    """Values of `prop` shared by more than one `label` node (these block a uniqueness constraint)."""
+    query = f"""
+    MATCH (n:{label}) WHERE n.{prop} IS NOT NULL
+    WITH n.{prop} AS value, count(*) AS copies WHERE copies > 1
+    RETURN value, copies ORDER BY copies DESC LIMIT $limit
+    """
+    return graph.query(query, params={"limit": limit})
+
+
+def ensure_schema(graph):
+    """
+    Idempotent schema bootstrap/migration: creates every missing uniqueness constraint
+    and lookup index. When duplicates block a constraint, a plain index is created
+    instead so lookups stay fast, and the offending values are reported.
+    Returns {"created": [...], "fallback_indexes": [...], "duplicates": {name: rows}}.
+    """
+    report = {"created": [], "fallback_indexes": [], "duplicates": {}}
+    try:
+        existing = {row["name"] for row in graph.query("SHOW CONSTRAINTS YIELD name RETURN name")}
+        existing |= {row["name"] for row in graph.query("SHOW INDEXES YIELD name RETURN name")}
+    except Exception as e:
+        logger.warning(f"Could not list schema, applying all statements: {e}")
+        existing = set()
+
+    for name, kind, label, prop, statement in _schema_statements():
+        if name in existing:
+            continue
+        try:
+            graph.query(statement)
+            report["created"].append(name)
+        except Exception as e:
+            if kind != "constraint":
+                logger.warning(f"Schema warning for {name}: {e}")
+                continue
+            duplicates = find_duplicates(graph, label, prop)
+            if not duplicates:
+                logger.warning(f"Schema warning for {name}: {e}")
+                continue
+            report["duplicates"][name] = duplicates
+            logger.warning(
+                f"Cannot create {name}: {len(duplicates)}+ duplicate {label}.{prop} values "
+                f"(e.g. {duplicates[0]['value']!r} x{duplicates[0]['copies']}). Merge them and re-run."
+            )
+            fallback = f"{name}_lookup"
+            if fallback not in existing:
+                graph.query(f"CREATE INDEX {fallback} IF NOT EXISTS FOR (n:{label}) ON (n.{prop})")
+                report["fallback_indexes"].append(fallback)
+
+    if report["created"]:
+        logger.info(f"Created schema objects: {report['created']}")
+    return report
+
+
+def save_schema_snapshot(graph, version, path=SCHEMA_SNAPSHOT_FILE):
+    """Re-introspects the graph (APOC meta, slow on big graphs) and stores the result. Returns version."""
+    graph.refresh_schema()
+    write_json_atomic(path, {"version": version, "schema": graph.schema, "structured_schema": graph.structured_schema})
+    logger.info(f"Schema snapshot saved for graph version {version}.")
+    return version
+
+
+def load_schema_snapshot(graph, path=SCHEMA_SNAPSHOT_FILE, version=None):
+    """
+    Puts a stored schema on `graph` without touching the database. Returns its version,
+    or None (also when `version` is given and the snapshot is stamped with another one).
+    """
+    snapshot = read_json(path, None, "schema snapshot")
+    if snapshot is None:
+        return None
+    if version is not None and snapshot.get("version") != version:
+        return None
+    graph.schema = snapshot["schema"]
+    graph.structured_schema = snapshot["structured_schema"]
+    return snapshot["version"]
+
+
+if __name__ == "__main__":
+    from graph_db import get_graph
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    graph = get_graph(write=True)
+    result = ensure_schema(graph)
+    print(f"✅ Created: {result['created'] or 'nothing (schema up to date)'}")
+    for name, rows in result["duplicates"].items():
+        print(f"⚠️ {name} blocked by duplicates:")
+        for row in rows:
+            print(f"   {row['value']!r} x{row['copies']}")
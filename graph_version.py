@@ -0,0 +1,48 @@
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A single meta node carries a counter that every successful ingest increments.
+# Readers (agent caches) compare it to decide whether what they hold is stale.
+GRAPH_META_LABEL = "GraphMeta"
+GRAPH_VERSION_POLL_SECONDS = float(os.getenv("GRAPH_VERSION_POLL_SECONDS", "15"))
+
+
+def bump_graph_version(graph):
+    """Called by the ingesters after a successful load. Returns the new version."""
+    result = graph.query(
+        f"""
+        MERGE (m:{GRAPH_META_LABEL} {{id: 'graph'}})
+        SET m.version = coalesce(m.version, 0) + 1, m.updated_at = datetime()
+        RETURN m.version AS version
+        """
+    )
+    version = result[0]["version"]
+    logger.info(f"Graph version is now {version}.")
+    return version
+
+
+def read_graph_version(graph):
+    result = graph.query(f"MATCH (m:{GRAPH_META_LABEL} {{id: 'graph'}}) RETURN m.version AS version")
+    return result[0]["version"] if result else 0
+
+
+class GraphVersionWatcher:
+    """Reads the version stamp at most once per poll interval."""
+    def __init__(self, graph, poll_seconds=GRAPH_VERSION_POLL_SECONDS):
+        self.graph = graph
+        self.poll_seconds = poll_seconds
+        self.version = None
+        self.checked_at = 0.0
+
+    def current(self):
+        now = time.monotonic()
+        if self.version is None or now - self.checked_at >= self.poll_seconds:
+            try:
+                self.version = read_graph_version(self.graph)
+            except Exception as e:
+                logger.warning(f"Could not read graph version: {e}")
+            self.checked_at = now
+        return self.version
@@ -1,16 +1,28 @@
 import os
+import time
+import queue
 import logging
-from datetime import datetime, timedelta
+import threading
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
 # Libraries
 from newsapi import NewsApiClient
 from langchain_openai import ChatOpenAI
 from langchain_experimental.graph_transformers import LLMGraphTransformer
-# FIX 1: Use the modern, non-deprecated library
-from langchain_neo4j import Neo4jGraph
 from langchain_core.documents import Document
 
+from cache import ExtractionCache, EXTRACTION_CACHE_FILE
+from graph_db import get_graph, warmup
+from graph_schema import ALLOWED_NODES, ALLOWED_RELATIONSHIPS, ensure_schema, save_schema_snapshot
+from entity_resolution import EntityIndex, Canonicalizer
+from graph_version import bump_graph_version
+from neighborhood import NeighborhoodSnapshots
+from state_files import read_json, write_json_atomic
+
 # --- CONFIGURATION ---
 load_dotenv()
 
@@ -22,27 +34,279 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Strict Schema Definition
-ALLOWED_NODES = ["Company", "Person", "Location", "Event", "Product"]
-ALLOWED_RELATIONSHIPS = [
-    "SUPPLIES_TO", "COMPETES_WITH", "LOCATED_IN", 
-    "AFFECTS", "HAS_CEO", "ANNOUNCED", "PARTNERS_WITH"
-]
+# Articles per UNWIND write transaction (tune against your Neo4j instance)
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "25"))
+
+# Parallel OpenAI extraction calls (keep within your rate limit)
+EXTRACTION_CONCURRENCY = int(os.getenv("EXTRACTION_CONCURRENCY", "4"))
+
+# Streaming pipeline: articles per dedup round trip, items buffered between stages
+DEDUP_BATCH_SIZE = int(os.getenv("DEDUP_BATCH_SIZE", "100"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "50"))
+CHECKPOINT_FILE = ".ingest_checkpoint.json"
+
+# Incremental fetching: each run starts from the previous run's high-water mark
+WATERMARK_FILE = ".fetch_watermark.json"
+WATERMARK_OVERLAP = timedelta(hours=1)  # NewsAPI indexes some articles late; dedup absorbs the overlap
+NEWS_PAGE_SIZE = 100
+MAX_FETCH_PAGES = int(os.getenv("MAX_FETCH_PAGES", "20"))
+# Point at a local fake NewsAPI server (e.g. http://localhost:8000) for tests
+NEWS_API_BASE_URL = os.getenv("NEWS_API_BASE_URL")
+NEWS_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# Articles whose extraction failed, retried at the start of the next runs
+RETRY_FILE = ".ingest_retry.json"
+MAX_EXTRACTION_ATTEMPTS = int(os.getenv("MAX_EXTRACTION_ATTEMPTS", "3"))
+# Local record of URLs already in the graph (set to None to always ask Neo4j)
+SEEN_URLS_FILE = ".seen_urls.json"
+# Most recently seen URLs kept; older ones fall back to the Neo4j check
+SEEN_URLS_MAX = int(os.getenv("SEEN_URLS_MAX", "50000"))
+
+class SeenUrlCache:
+    """
+    Persisted set of article URLs known to be loaded into Neo4j, bounded to the
+    max_size most recently seen (insertion-ordered dict, oldest evicted first).
+    Lets scheduled runs skip the database for URLs seen on a previous run.
+    Written once per run; delete the file after wiping the database.
+    """
+    def __init__(self, path=SEEN_URLS_FILE, max_size=SEEN_URLS_MAX):
+        self.path = path
+        self.max_size = max_size
+        self.dirty = False
+        self.lock = threading.Lock()  # Fetch, dedup and load stages share one cache
+        self.urls = dict.fromkeys(read_json(path, [], "seen-URL cache")[-max_size:])
+
+    def __contains__(self, url):
+        return url in self.urls
+
+    def add_many(self, urls):
+        with self.lock:
+            for url in urls:
+                self.urls.pop(url, None)
+                self.urls[url] = None
+                self.dirty = True
+            while len(self.urls) > self.max_size:
+                del self.urls[next(iter(self.urls))]
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            write_json_atomic(self.path, list(self.urls))
+            self.dirty = False
+
+class NewsApiHttpClient:
+    """
+    Minimal stand-in for newsapi.NewsApiClient talking to any NewsAPI-compatible
+    base URL over a pooled HTTP session. Used when NEWS_API_BASE_URL is set.
+    """
+    def __init__(self, base_url, api_key):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        self.session.headers["X-Api-Key"] = api_key or ""
+
+    def get_everything(self, q=None, from_param=None, to=None, language=None,
+                       sort_by=None, page=None, page_size=None):
+        params = {
+            "q": q, "from": from_param, "to": to, "language": language,
+            "sortBy": sort_by, "page": page, "pageSize": page_size
+        }
+        response = self.session.get(
+            f"{self.base_url}/v2/everything",
+            params={k: v for k, v in params.items() if v is not None},
+            timeout=30
+        )
+        response.raise_for_status()
+        return response.json()
+
+class FetchWatermark:
+    """Upper bound of the last fully ingested NewsAPI window."""
+    def __init__(self, path=WATERMARK_FILE):
+        self.path = path
+
+    def load(self):
+        data = read_json(self.path, None, "watermark")
+        if data is None:
+            return None
+        try:
+            return datetime.strptime(data["to"], NEWS_DATE_FORMAT)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable watermark {self.path}: {e}")
+            return None
+
+    def save(self, to_date):
+        write_json_atomic(self.path, {"to": to_date})
+
+class IngestCheckpoint:
+    """
+    Resume point of an interrupted run: the NewsAPI window that was being ingested,
+    how many articles of that stream are fully handled, and the watermark to save
+    once the window is complete (`target`; a gap window keeps its parent run's `to`).
+    """
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+
+    def load(self):
+        return read_json(self.path, None, "checkpoint")
+
+    def save(self, window, position, target=None):
+        write_json_atomic(self.path, {"window": window, "position": position, "target": target or window["to"]})
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class RetryQueue:
+    """
+    Articles whose extraction failed, keyed by URL with their attempt count.
+    Saved on every change, so the checkpoint can move past a failed article
+    without losing it. Entries are dropped after MAX_EXTRACTION_ATTEMPTS tries.
+    """
+    def __init__(self, path=RETRY_FILE, max_attempts=MAX_EXTRACTION_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.entries = read_json(path, {}, "retry list")
+        self.lock = threading.Lock()
+
+    def articles(self):
+        with self.lock:
+            return [entry["article"] for entry in self.entries.values()]
+
+    def add(self, article):
+        with self.lock:
+            attempts = self.entries.get(article["url"], {}).get("attempts", 0) + 1
+            if attempts >= self.max_attempts:
+                logger.error(f"Giving up on {article['url']} after {attempts} failed extractions.")
+                self.entries.pop(article["url"], None)
+            else:
+                self.entries[article["url"]] = {"article": article, "attempts": attempts}
+            self._save()
+
+    def discard(self, urls):
+        with self.lock:
+            removed = [self.entries.pop(url) for url in urls if url in self.entries]
+            if removed:
+                self._save()
+
+    def _save(self):
+        try:
+            write_json_atomic(self.path, self.entries)
+        except Exception as e:
+            logger.warning(f"Could not persist retry list: {e}")
+
+_STAGE_DONE = object()
+
+def graph_document_to_payload(graph_doc):
+    """Flattens a GraphDocument into plain, JSON-safe node/relationship dicts."""
+    return {
+        "nodes": [
+            {"id": node.id, "type": node.type, "properties": node.properties}
+            for node in graph_doc.nodes
+        ],
+        "rels": [
+            {
+                "source_id": rel.source.id, "source_type": rel.source.type,
+                "target_id": rel.target.id, "target_type": rel.target.type,
+                "type": rel.type, "properties": rel.properties
+            }
+            for rel in graph_doc.relationships
+        ]
+    }
+
+def article_row(metadata, payload):
+    """One UNWIND row: the source article plus everything extracted from it."""
+    return {"url": metadata["url"], "title": metadata["title"], **payload}
+
+class GraphBulkLoader:
+    """
+    Buffers extracted articles and writes each batch with a single UNWIND query,
+    i.e. one write transaction per batch instead of several per article.
+    Entities are merged by label + id so the MENTIONED_IN link uses the id index.
+    """
+    LOAD_QUERY = """
+    UNWIND $rows AS row
+    MERGE (a:Article {url: row.url})
+    SET a.title = row.title, a.processed_at = datetime()
+    WITH a, row
+    CALL {
+        WITH a, row
+        UNWIND row.nodes AS node
+        CALL apoc.merge.node([node.type], {id: node.id}, node.properties, {}) YIELD node AS n
+        MERGE (n)-[:MENTIONED_IN]->(a)
+        RETURN count(n) AS node_count
+    }
+    CALL {
+        WITH row
+        UNWIND row.rels AS rel
+        CALL apoc.merge.node([rel.source_type], {id: rel.source_id}, {}, {}) YIELD node AS s
+        CALL apoc.merge.node([rel.target_type], {id: rel.target_id}, {}, {}) YIELD node AS t
+        CALL apoc.merge.relationship(s, rel.type, {}, rel.properties, t) YIELD rel AS r
+        RETURN count(r) AS rel_count
+    }
+    RETURN count(a) AS articles, sum(node_count) AS nodes, sum(rel_count) AS rels
+    """
+
+    def __init__(self, graph, batch_size=LOAD_BATCH_SIZE):
+        self.graph = graph
+        self.batch_size = max(1, batch_size)
+        self.buffer = []
+
+    def add(self, row):
+        """Queues one article row. Returns the rows written if this filled a batch."""
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """Writes everything buffered in one transaction. Returns the rows written."""
+        if not self.buffer:
+            return []
+        rows, self.buffer = self.buffer, []
+
+        start = time.perf_counter()
+        result = self.graph.query(self.LOAD_QUERY, params={"rows": rows})
+        elapsed = max(time.perf_counter() - start, 1e-6)
+
+        stats = result[0] if result else {"articles": 0, "nodes": 0, "rels": 0}
+        written = stats["articles"] + stats["nodes"] + stats["rels"]
+        logger.info(
+            f"Loaded batch of {len(rows)} articles ({written} rows) in {elapsed:.2f}s "
+            f"-> {written / elapsed:.0f} rows/s"
+        )
+        return rows
 
 class NvidiaSentinelETL:
-    def __init__(self):
+    def __init__(self, seen_cache_path=SEEN_URLS_FILE, load_batch_size=LOAD_BATCH_SIZE,
+                 extraction_concurrency=EXTRACTION_CONCURRENCY,
+                 extraction_cache_path=EXTRACTION_CACHE_FILE,
+                 checkpoint_path=CHECKPOINT_FILE,
+                 watermark_path=WATERMARK_FILE,
+                 retry_path=RETRY_FILE,
+                 news_client=None):
         self._validate_env()
-        self.news_api = NewsApiClient(api_key=os.getenv("NEWS_API_KEY"))
+        self.fetch_result = {"complete": False, "oldest": None}
+        self.loaded_count = 0
+        # Any object with NewsApiClient.get_everything's signature can be swapped in
+        if news_client is not None:
+            self.news_api = news_client
+        elif NEWS_API_BASE_URL:
+            self.news_api = NewsApiHttpClient(NEWS_API_BASE_URL, os.getenv("NEWS_API_KEY"))
+        else:
+            self.news_api = NewsApiClient(api_key=os.getenv("NEWS_API_KEY"))
         
-        # Connect to Neo4j
-        self.graph = Neo4jGraph(
-            url=os.getenv("NEO4J_URI"),
-            username=os.getenv("NEO4J_USERNAME"),
-            password=os.getenv("NEO4J_PASSWORD")
-        )
+        # Connect to Neo4j (shared pooled driver, write sessions)
+        warmup(write=True)
+        self.graph = get_graph(write=True)
         
         # FIX 2: Initialize Constraints specifically for Professional Data Integrity
         self._initialize_schema()
+        self.seen_urls = SeenUrlCache(seen_cache_path) if seen_cache_path else None
+        self.loader = GraphBulkLoader(self.graph, batch_size=load_batch_size)
+        self.extraction_concurrency = max(1, extraction_concurrency)
+        self.checkpoint = IngestCheckpoint(checkpoint_path)
+        self.watermark = FetchWatermark(watermark_path)
+        self.retries = RetryQueue(retry_path)
 
         # The Brain
         # Note: Swapped to gpt-4o-mini to save you money during dev. 
@@ -54,6 +318,10 @@ class NvidiaSentinelETL:
             allowed_nodes=ALLOWED_NODES,
             allowed_relationships=ALLOWED_RELATIONSHIPS
         )
+        # Re-ingests replay cached extractions instead of paying OpenAI again
+        self.extraction_cache = ExtractionCache(extraction_cache_path) if extraction_cache_path else None
+        # Variant names ("Taiwan Semiconductor") collapse onto ids already in the graph ("TSMC")
+        self.canonicalizer = Canonicalizer(known_ids=[e["id"] for e in EntityIndex().entities])
 
     def _validate_env(self):
         """Ensures all secrets are present."""
@@ -65,101 +333,430 @@ class NvidiaSentinelETL:
     def _initialize_schema(self):
         """
         Creates constraints to ensure data integrity.
-        This prevents duplicate Articles and silences 'Label not found' warnings.
+        This prevents duplicate Articles/entities, backs every id lookup with an index
+        and silences 'Label not found' warnings.
         """
         logger.info("Initializing Graph Schema & Constraints...")
         try:
-            self.graph.query("CREATE CONSTRAINT article_url IF NOT EXISTS FOR (a:Article) REQUIRE a.url IS UNIQUE")
-            self.graph.query("CREATE INDEX article_date IF NOT EXISTS FOR (a:Article) ON (a.processed_at)")
+            ensure_schema(self.graph)
         except Exception as e:
             logger.warning(f"Schema initialization warning (can often be ignored if constraints exist): {e}")
 
-    def fetch_articles(self, days_back=30):
-        """Fetches highly specific supply chain news."""
+    def fetch_articles(self, days_back=30, from_date=None, to_date=None, resume_from=0):
+        """
+        Fetches highly specific supply chain news, newest first, page by page.
+        Yields articles as each page arrives. Pagination stops at the last page, at
+        MAX_FETCH_PAGES, or at the first page whose URLs are all already ingested
+        (ignored for the first `resume_from` articles, which a resumed run has loaded).
+        Each page is checked against the graph once: articles carry the result as
+        `is_new`, which the dedup stage uses instead of querying again.
+        Afterwards self.fetch_result tells whether the window was fetched completely and
+        the oldest publishedAt seen (older articles are missing when it was not).
+        """
+        self.fetch_result = {"complete": False, "oldest": None}
         query = "(Nvidia OR TSMC OR ASML) AND (supply OR shortage OR delay OR production OR tariff)"
-        from_date = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d')
+        if from_date is None:
+            from_date = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d')
         
-        logger.info(f"Fetching news for query: '{query}' since {from_date}")
+        logger.info(f"Fetching news for query: '{query}' from {from_date} to {to_date or 'now'}")
         
-        try:
-            response = self.news_api.get_everything(
-                q=query,
-                from_param=from_date,
-                language='en',
-                sort_by='relevancy',
-                page_size=100
-            )
+        fetched = 0
+        for page in range(1, MAX_FETCH_PAGES + 1):
+            try:
+                response = self.news_api.get_everything(
+                    q=query,
+                    from_param=from_date,
+                    to=to_date,
+                    language='en',
+                    sort_by='publishedAt',
+                    page=page,
+                    page_size=NEWS_PAGE_SIZE
+                )
+            except Exception as e:
+                # e.g. the plan's maximumResultsReached: keep what we already streamed,
+                # run() fetches the older remainder of the window next time
+                logger.error(f"Failed to fetch news page {page}: {e}")
+                return
+
             articles = response.get('articles', [])
-            logger.info(f"Fetched {len(articles)} articles.")
-            return articles
+            fetched += len(articles)
+            logger.info(f"Fetched page {page}: {len(articles)} articles ({fetched}/{response.get('totalResults', '?')}).")
+            unseen = None
+            if fetched > resume_from:
+                # Pages a resumed run already handled are skipped by the dedup stage unchecked
+                unseen = set(self.filter_unprocessed(a['url'] for a in articles))
+                for article in articles:
+                    article['is_new'] = article['url'] in unseen
+            yield from articles
+
+            published = [a['publishedAt'][:19] for a in articles if a.get('publishedAt')]
+            if published:
+                oldest = self.fetch_result["oldest"]
+                self.fetch_result["oldest"] = min(published + ([oldest] if oldest else []))
+
+            if len(articles) < NEWS_PAGE_SIZE or fetched >= response.get('totalResults', 0):
+                self.fetch_result["complete"] = True
+                return
+            if unseen is not None and not unseen:
+                logger.info("Reached already-ingested articles. Stopping pagination.")
+                self.fetch_result["complete"] = True
+                return
+        logger.warning(f"Stopped at MAX_FETCH_PAGES={MAX_FETCH_PAGES}; older articles of the window follow next run.")
+
+    def _next_window(self, days_back):
+        """NewsAPI window for a fresh run: from the high-water mark (minus overlap) to now."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        since = self.watermark.load() or self._latest_processed_at()
+        if since is None:
+            since = now - timedelta(days=days_back)
+        else:
+            since = max(since - WATERMARK_OVERLAP, now - timedelta(days=days_back))
+        return {"from": since.strftime(NEWS_DATE_FORMAT), "to": now.strftime(NEWS_DATE_FORMAT)}
+
+    def _latest_processed_at(self):
+        """Fallback watermark when no state file exists: newest Article already in the graph."""
+        try:
+            result = self.graph.query("MATCH (a:Article) RETURN toString(max(a.processed_at)) AS latest")
+            latest = result[0]['latest'] if result else None
+            if latest:
+                return datetime.fromisoformat(latest).astimezone(timezone.utc).replace(tzinfo=None)
         except Exception as e:
-            logger.error(f"Failed to fetch news: {e}")
+            logger.warning(f"Could not read latest processed_at: {e}")
+        return None
+
+    def filter_unprocessed(self, urls):
+        """
+        Set-based Idempotency Check.
+        Returns the URLs not yet in the graph, in input order, using one
+        UNWIND round trip (backed by the article_url constraint) for the whole batch.
+        """
+        candidates = list(dict.fromkeys(urls))
+        if self.seen_urls is not None:
+            candidates = [url for url in candidates if url not in self.seen_urls]
+        if not candidates:
             return []
 
-    def check_if_processed(self, url):
-        """Idempotency Check."""
-        query = "MATCH (a:Article {url: $url}) RETURN count(a) > 0 as exists"
-        result = self.graph.query(query, params={"url": url})
-        return result[0]['exists']
+        query = """
+        UNWIND $urls AS url
+        OPTIONAL MATCH (a:Article {url: url})
+        WITH url, a WHERE a IS NULL
+        RETURN collect(url) AS unseen
+        """
+        result = self.graph.query(query, params={"urls": candidates})
+        unseen = set(result[0]['unseen'])
 
-    def process_and_load(self, articles):
-        documents = []
-        
-        for article in articles:
+        self._mark_processed([url for url in candidates if url not in unseen])
+        return [url for url in candidates if url in unseen]
+
+    def _mark_processed(self, urls):
+        urls = list(urls)
+        if self.seen_urls is None or not urls:
+            return
+        self.seen_urls.add_many(urls)
+
+    def _save_seen_urls(self):
+        if self.seen_urls is None:
+            return
+        try:
+            self.seen_urls.save()
+        except Exception as e:
+            logger.warning(f"Could not persist seen-URL cache: {e}")
+
+    def _extract(self, doc):
+        """Extracts one document, serving from the extraction cache when possible."""
+        if self.extraction_cache is None:
+            return graph_document_to_payload(self.transformer.process_response(doc))
+
+        key = ExtractionCache.make_key(
+            doc.page_content, ALLOWED_NODES, ALLOWED_RELATIONSHIPS, self.llm.model_name
+        )
+        payload = self.extraction_cache.get(key)
+        if payload is None:
+            payload = graph_document_to_payload(self.transformer.process_response(doc))
+            self.extraction_cache.put(key, payload)
+        else:
+            logger.info(f"Extraction cache hit: {doc.metadata['title'][:30]}...")
+        return payload
+
+    def extract_graph_documents(self, documents):
+        """
+        Parallel AI Extraction on a bounded worker pool.
+        Yields (document, payload, error) in input order, each as soon as it and
+        every earlier document are done. A failed article yields its error instead of raising.
+        """
+        pool = ThreadPoolExecutor(max_workers=self.extraction_concurrency)
+        pending = deque()
+        docs = iter(documents)
+
+        def submit_next():
+            doc = next(docs, None)
+            if doc is not None:
+                pending.append((doc, pool.submit(self._extract, doc)))
+
+        try:
+            # Keep a small read-ahead so workers never idle while we load results
+            for _ in range(self.extraction_concurrency * 2):
+                submit_next()
+            while pending:
+                doc, future = pending.popleft()
+                try:
+                    yield doc, future.result(), None
+                except Exception as e:
+                    yield doc, None, e
+                submit_next()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _dedup_stage(self, articles, start=0):
+        """
+        Pipeline Stage 2: Dedup.
+        Numbers every fetched article (its checkpoint position), skips the first `start`
+        on resume, and checks the rest against the graph in DEDUP_BATCH_SIZE chunks.
+        Yields Documents for new articles only.
+        """
+        chunk = []
+        for position, article in enumerate(articles):
+            if position < start:
+                continue
+            chunk.append((position, article))
+            if len(chunk) >= DEDUP_BATCH_SIZE:
+                yield from self._new_documents(chunk)
+                chunk = []
+        if chunk:
+            yield from self._new_documents(chunk)
+
+    def _new_documents(self, chunk):
+        if all('is_new' in article for _, article in chunk):
+            # fetch_articles already checked these against the graph
+            new_urls = {article['url'] for _, article in chunk if article['is_new']}
+        else:
+            new_urls = set(self.filter_unprocessed(article['url'] for _, article in chunk))
+
+        for position, article in chunk:
             url = article['url']
             title = article['title']
             content = f"{title}\n{article.get('description', '')}"
             
-            if self.check_if_processed(url):
+            if url not in new_urls:
                 logger.info(f"Skipping duplicate: {title[:30]}...")
                 continue
+            new_urls.discard(url)  # Same URL twice in one page
             
-            doc = Document(page_content=content, metadata={"source": "newsapi", "url": url, "title": title})
-            documents.append(doc)
+            yield Document(
+                page_content=content,
+                metadata={
+                    "source": "newsapi", "url": url, "title": title, "position": position,
+                    "description": article.get('description', ''), "publishedAt": article.get('publishedAt')
+                }
+            )
+
+    def _buffered(self, iterable, maxsize=PIPELINE_QUEUE_SIZE):
+        """
+        Runs a pipeline stage in a background thread, handing items to the next
+        stage through a bounded queue (so a fast stage can never run away with memory).
+        Exceptions raised by the stage are re-raised in the consumer.
+        """
+        handoff = queue.Queue(maxsize=maxsize)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    handoff.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for item in iterable:
+                    if not put((item, None)):
+                        return
+                put((_STAGE_DONE, None))
+            except Exception as e:
+                put((_STAGE_DONE, e))
+
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            while True:
+                item, error = handoff.get()
+                if item is _STAGE_DONE:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            stop.set()
 
-        if not documents:
+    def process_and_load(self, articles, start=0, on_checkpoint=None):
+        """
+        Streaming pipeline: fetch -> dedup -> extract -> load.
+        `articles` may be any iterable (e.g. a paginated generator); nothing holds the
+        whole batch in memory. After every durable write, on_checkpoint(position) is called
+        with the stream position a restart can resume from. Articles whose extraction
+        fails go to the retry list; self.loaded_count counts the articles written.
+        Returns False if the run was stopped early (quota), True once the stream is exhausted.
+        """
+        logger.info(f"Extracting Knowledge Graph ({self.extraction_concurrency} parallel workers)...")
+        if start:
+            logger.info(f"Resuming after {start} already-handled articles.")
+
+        # Stages 1 + 2 run ahead in their own threads, bounded by queues
+        documents = self._buffered(self._dedup_stage(self._buffered(articles), start=start))
+        extracted = self.extract_graph_documents(documents)
+
+        loaded, failed, completed = 0, 0, True
+
+        def record(written_rows):
+            nonlocal loaded
+            if not written_rows:
+                return
+            loaded += len(written_rows)
+            self.loaded_count += len(written_rows)
+            self._mark_processed(row["url"] for row in written_rows)
+            self.retries.discard(row["url"] for row in written_rows)
+            if on_checkpoint:
+                on_checkpoint(max(row["position"] for row in written_rows) + 1)
+
+        try:
+            # Stage 3: AI Extraction (parallel, results arrive in input order)
+            for doc, payload, error in extracted:
+                if error is not None:
+                    if "insufficient_quota" in str(error):
+                        # Every remaining call would fail the same way
+                        logger.critical("🚨 OPENAI QUOTA EXCEEDED. Go to platform.openai.com/billing to add credits.")
+                        completed = False
+                        break
+                    failed += 1
+                    logger.error(f"Graph transformation failed for {doc.metadata['url']}: {error}")
+                    self.retries.add({
+                        key: doc.metadata[key] for key in ("url", "title", "description", "publishedAt")
+                    })
+                    continue
+
+                # Stage 4: Bulk Load Entities/Relationships + MENTIONED_IN citation links
+                row = article_row(doc.metadata, self.canonicalizer.canonicalize_payload(payload))
+                row["position"] = doc.metadata["position"]
+                record(self.loader.add(row))
+        except Exception:
+            completed = False
+            raise
+        finally:
+            # Whatever was extracted before a stop still gets written
+            extracted.close()
+            record(self.loader.flush())
+            documents.close()
+
+        if loaded == 0 and failed == 0 and completed:
             logger.warning("No new documents to process.")
-            return
+        else:
+            logger.info(f"✅ Successfully ingested {loaded} articles into Neo4j ({failed} failed).")
+        return completed
 
-        logger.info(f"Extracting Knowledge Graph from {len(documents)} documents...")
-        
+    def _after_ingest(self):
+        """Entity index, graph version, schema snapshot and neighborhoods, once per run that wrote."""
+        self._refresh_entity_index()
+        version = self._bump_graph_version()
+        if version is not None:
+            self._save_schema_snapshot(version)
+            self._materialize_neighborhoods(version)
+
+    def _refresh_entity_index(self):
+        """Lets the agent resolve the new entities without scanning the graph."""
         try:
-            # 1. AI Extraction
-            graph_documents = self.transformer.convert_to_graph_documents(documents)
-            
-            for i, graph_doc in enumerate(graph_documents):
-                article_meta = documents[i].metadata
-                
-                # 2. Add the Entities/Relationships to DB
-                self.graph.add_graph_documents([graph_doc])
-                
-                # FIX 3: THE "PRO" LINKING STEP
-                # Connect the extracted entities back to the source Article.
-                # This enables "Citations" in your final app.
-                self.graph.query(
-                    """
-                    MERGE (a:Article {url: $url})
-                    SET a.title = $title, a.processed_at = datetime()
-                    WITH a
-                    MATCH (n) WHERE n.id IN $node_ids
-                    MERGE (n)-[:MENTIONED_IN]->(a)
-                    """, 
-                    params={
-                        "url": article_meta["url"], 
-                        "title": article_meta["title"],
-                        "node_ids": [node.id for node in graph_doc.nodes]
-                    }
-                )
+            EntityIndex().rebuild(self.graph)
+        except Exception as e:
+            logger.warning(f"Entity index refresh failed: {e}")
 
-            logger.info(f"✅ Successfully ingested {len(documents)} articles into Neo4j.")
-            
+    def _bump_graph_version(self):
+        """Tells the agent's caches that the graph changed."""
+        try:
+            return bump_graph_version(self.graph)
         except Exception as e:
-            if "insufficient_quota" in str(e):
-                logger.critical("🚨 OPENAI QUOTA EXCEEDED. Go to platform.openai.com/billing to add credits.")
-            else:
-                logger.error(f"Graph transformation failed: {e}")
+            logger.warning(f"Graph version bump failed: {e}")
+            return None
+
+    def _save_schema_snapshot(self, version):
+        """Lets the agent start from the stored schema instead of introspecting the graph."""
+        try:
+            save_schema_snapshot(self.graph, version)
+        except Exception as e:
+            logger.warning(f"Schema snapshot failed: {e}")
+
+    def _materialize_neighborhoods(self, version):
+        """Precomputes the hot entities' ego graphs so the agent serves them without a live query."""
+        try:
+            NeighborhoodSnapshots().materialize(self.graph, version)
+        except Exception as e:
+            logger.warning(f"Neighborhood materialization failed: {e}")
+
+    def retry_failed(self):
+        """
+        Re-extracts the articles whose extraction failed on earlier runs.
+        Returns False if the retry pass was stopped early (quota).
+        """
+        articles = self.retries.articles()
+        if not articles:
+            return True
+        logger.info(f"Retrying {len(articles)} previously failed articles...")
+        # Articles loaded some other way since they failed need no retry
+        unprocessed = set(self.filter_unprocessed(article["url"] for article in articles))
+        self.retries.discard(article["url"] for article in articles if article["url"] not in unprocessed)
+        return self.process_and_load([article for article in articles if article["url"] in unprocessed])
+
+    def run(self, days_back=30):
+        """
+        Full incremental ingestion run. Retries earlier failed extractions, then resumes
+        from the checkpoint if the last run was cut short, otherwise fetches everything
+        newer than the watermark.
+        """
+        self.loaded_count = 0
+        try:
+            self._run(days_back)
+        finally:
+            # Once per run, after the retry and the window pass (also when one stopped early)
+            if self.loaded_count:
+                self._after_ingest()
+            # A lost cache only costs extra Neo4j lookups next time
+            self._save_seen_urls()
+
+    def _run(self, days_back):
+        if not self.retry_failed():
+            return
+
+        state = self.checkpoint.load()
+        if state:
+            window, start = state["window"], state["position"]
+            target = state.get("target") or window["to"]
+            logger.info(f"Found checkpoint: resuming window {window['from']} -> {window['to']} at article {start}.")
+        else:
+            window, start = self._next_window(days_back), 0
+            target = window["to"]
+        self.checkpoint.save(window, start, target)
+
+        completed = self.process_and_load(
+            self.fetch_articles(from_date=window["from"], to_date=window["to"], resume_from=start),
+            start=start,
+            on_checkpoint=lambda position: self.checkpoint.save(window, position, target)
+        )
+        if not completed:
+            return  # Checkpoint kept: the next run resumes where this one stopped
+
+        oldest = self.fetch_result["oldest"]
+        if self.fetch_result["complete"]:
+            self.watermark.save(target)
+            self.checkpoint.clear()
+        elif oldest and window["from"] < oldest < window["to"]:
+            # Pagination stopped early (fetch error, MAX_FETCH_PAGES): results are newest
+            # first, so only [from, oldest] is missing. Fetch that gap next run; the
+            # watermark moves to `target` once the gap is complete.
+            gap = {"from": window["from"], "to": oldest}
+            self.checkpoint.save(gap, 0, target)
+            logger.warning(f"Window only partially fetched; next run fetches {gap['from']} -> {gap['to']}.")
+        else:
+            logger.warning("Window not fetched completely; keeping the checkpoint to retry it next run.")
 
 if __name__ == "__main__":
     bot = NvidiaSentinelETL()
-    news = bot.fetch_articles()
-    bot.process_and_load(news)
\ No newline at end of file
+    bot.run()
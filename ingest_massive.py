@@ -1,139 +1,307 @@
 import os
+import json
 import time
+import threading
 import requests
+from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from langchain_neo4j import Neo4jGraph
 from dotenv import load_dotenv
 
+from entity_matcher import EntityMatcher, ENTITY_DICTIONARY_FILE
+from graph_db import get_graph, session as db_session, warmup
+from graph_schema import ensure_schema, save_schema_snapshot
+from entity_resolution import EntityIndex, Canonicalizer
+from graph_version import bump_graph_version
+from neighborhood import NeighborhoodSnapshots
+
 # --- CONFIGURATION ---
 load_dotenv()
 
 # The target URL pattern (We use a placeholder here for safety)
 # In a real scenario, you would use: "https://nvidianews.nvidia.com/news?page={}"
-BASE_URL = "https://nvidianews.nvidia.com/news?page="
+# Override CRAWL_BASE_URL to crawl a local fixture server (e.g. http://localhost:8000/news?page=)
+BASE_URL = os.getenv("CRAWL_BASE_URL", "https://nvidianews.nvidia.com/news?page=")
 START_PAGE = 1
-MAX_PAGES = 5  # Increase this to 10, 20, or 50 for "Way More Data"
+MAX_PAGES = int(os.getenv("MAX_PAGES", "5"))  # Increase this to 10, 20, or 50 for "Way More Data"
+
+# Crawler tuning: parallel page fetches, and per-host politeness (requests/second + burst;
+# a rate of 0 or less turns the throttle off)
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+CRAWL_RATE_PER_HOST = float(os.getenv("CRAWL_RATE_PER_HOST", "1.0"))
+CRAWL_BURST = int(os.getenv("CRAWL_BURST", "2"))
+
+# Add headers to look like a real browser (Prevents blocking)
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
+
+# Keyword NER: one matcher built from the external dictionaries (plus every known alias
+# of their terms), reused for every article. Matches are written under the canonical id.
+CANONICALIZER = Canonicalizer()
+
+def build_matcher(path=ENTITY_DICTIONARY_FILE):
+    with open(path, "r") as f:
+        dictionaries = json.load(f)
+    return EntityMatcher({
+        label: [alias for term in terms for alias in [term, *CANONICALIZER.aliases_of(term)]]
+        for label, terms in dictionaries.items()
+    })
+
+MATCHER = build_matcher()
 
-# Neo4j Connection
-graph = Neo4jGraph(
-    url=os.getenv("NEO4J_URI"),
-    username=os.getenv("NEO4J_USERNAME"),
-    password=os.getenv("NEO4J_PASSWORD")
-)
+# Fixed query texts: values travel as parameters, so Neo4j plans each query once
+# Returns how many articles are new or changed (re-crawled unchanged pages count 0)
+CREATE_ARTICLES_QUERY = """
+UNWIND $rows AS row
+MERGE (a:Article {url: row.url})
+WITH a, row, NOT coalesce(a.title = row.title AND a.date = row.date AND a.text = row.text, false) AS changed
+SET a.title = row.title,
+    a.date = row.date,
+    a.text = row.text
+RETURN count(CASE WHEN changed THEN 1 END) AS written
+"""
+
+# Writes the (article, entity, relation) tuples found in Python. One round trip per page.
+LINK_ENTITIES_QUERY = """
+CALL {
+    UNWIND $companies AS row
+    MATCH (a:Article {url: row.url})
+    MERGE (c:Company {id: row.entity})
+    MERGE (c)-[:MENTIONED_IN]->(a)
+}
+CALL {
+    UNWIND $products AS row
+    MATCH (a:Article {url: row.url})
+    MERGE (p:Product {id: row.entity})
+    MERGE (p)-[:MENTIONED_IN]->(a)
+    // Link Product to Nvidia automatically
+    MERGE (n:Company {id: 'Nvidia'})
+    MERGE (n)-[:PRODUCES]->(p)
+}
+CALL {
+    UNWIND $events AS row
+    MATCH (a:Article {url: row.url})
+    MERGE (e:Event {id: row.entity})
+    MERGE (a)-[:REPORTED_EVENT]->(e)
+}
+"""
+
+# How each dictionary label is attached to its article
+ENTITY_RELATIONS = {"Company": "MENTIONED_IN", "Product": "MENTIONED_IN", "Event": "REPORTED_EVENT"}
 
 def clean_text(text):
-    return text.strip().replace('"', "'")
+    return text.strip()
 
-def ingest_article(title, date, url, content):
+def match_entities(rows):
     """
-    Inserts a single article and runs the Entity Extraction Cypher immediately.
+    Simple Named Entity Recognition (NER) using dictionary keyword matching.
+    In a production app, you would use an LLM here, but this is faster for bulk data.
+    Returns (article_url, (label, entity_id), relation) tuples.
     """
-    print(f"  └── Processing: {title[:30]}...")
-    
-    # 1. Create Article Node
-    query_create = f"""
-    MERGE (a:Article {{url: "{url}"}})
-    SET a.title = "{clean_text(title)}",
-        a.date = "{date}",
-        a.text = "{clean_text(content[:1000])}..." 
+    matches = []
+    for row in rows:
+        found = {
+            (label, CANONICALIZER.canonical(term))
+            for label, term in MATCHER.find(f"{row['title']}\n{row['text']}")
+        }
+        for label, entity in sorted(found):
+            if label in ENTITY_RELATIONS:
+                matches.append((row["url"], (label, entity), ENTITY_RELATIONS[label]))
+    return matches
+
+def ingest_articles(graph, articles):
     """
-    graph.query(query_create)
-    
-    # 2. Extract Entities (The "Brain" Part)
-    # This acts as a simple Named Entity Recognition (NER) using Cypher keyword matching
-    # In a production app, you would use an LLM here, but this is faster for bulk data.
-    query_extract = f"""
-    MATCH (a:Article {{url: "{url}"}})
-    
-    # Find Companies
-    FOREACH (company IN ['Nvidia', 'TSMC', 'Intel', 'AMD', 'ASML', 'Microsoft', 'Google', 'Meta'] | 
-        FOREACH (_ IN CASE WHEN toLower(a.title) CONTAINS toLower(company) OR toLower(a.text) CONTAINS toLower(company) THEN [1] ELSE [] END |
-            MERGE (c:Company {{id: company}})
-            MERGE (c)-[:MENTIONED_IN]->(a)
-        )
-    )
-
-    # Find Products
-    FOREACH (product IN ['H100', 'Blackwell', 'Hopper', 'Grace CPU', 'RTX 4090', 'Rubin', 'CUDA'] | 
-        FOREACH (_ IN CASE WHEN toLower(a.title) CONTAINS toLower(product) OR toLower(a.text) CONTAINS toLower(product) THEN [1] ELSE [] END |
-            MERGE (p:Product {{id: product}})
-            MERGE (p)-[:MENTIONED_IN]->(a)
-            # Link Product to Nvidia automatically
-            MERGE (n:Company {{id: 'Nvidia'}})
-            MERGE (n)-[:PRODUCES]->(p)
-        )
-    )
-    
-    # Find Events
-    FOREACH (event IN ['Earnings', 'Acquisition', 'Launch', 'Delay', 'Sanction', 'Partnership'] | 
-        FOREACH (_ IN CASE WHEN toLower(a.title) CONTAINS toLower(event) OR toLower(a.text) CONTAINS toLower(event) THEN [1] ELSE [] END |
-            MERGE (e:Event {{id: event}})
-            MERGE (a)-[:REPORTED_EVENT]->(e)
-        )
-    )
+    Inserts one page of scraped articles and links their entities.
+    Two parameterized UNWIND round trips per page, however many articles it has.
+    Each article is a dict with title, date, url and content.
+    Returns the number of changes: new or changed articles plus entities and links
+    created (a grown dictionary links new entities to unchanged articles).
+    """
+    if not articles:
+        return 0
+
+    for article in articles:
+        print(f"  └── Processing: {article['title'][:30]}...")
+
+    # 1. Create Article Nodes
+    rows = [
+        {
+            "url": article["url"],
+            "title": clean_text(article["title"]),
+            "date": article["date"],
+            "text": clean_text(article["content"][:1000]) + "..."
+        }
+        for article in articles
+    ]
+    written = graph.query(CREATE_ARTICLES_QUERY, params={"rows": rows})[0]["written"]
+
+    # 2. Extract Entities (The "Brain" Part) in Python; the database only receives writes
+    params = {"companies": [], "products": [], "events": []}
+    param_for_label = {"Company": "companies", "Product": "products", "Event": "events"}
+    for url, (label, entity), _ in match_entities(rows):
+        params[param_for_label[label]].append({"url": url, "entity": entity})
+    # MERGE reports nothing in its rows; the summary counters tell what it created
+    with db_session(write=True) as s:
+        counters = s.execute_write(lambda tx: tx.run(LINK_ENTITIES_QUERY, params).consume().counters)
+    return written + counters.nodes_created + counters.relationships_created
+
+class TokenBucket:
     """
-    graph.query(query_extract)
+    Thread-safe token bucket: allows `burst` requests at once, refilled at `rate` per second.
+    A rate of 0 or less means no throttling.
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class HostThrottle:
+    """One TokenBucket per host, so politeness applies per server, not per crawl."""
+    def __init__(self, rate=CRAWL_RATE_PER_HOST, burst=CRAWL_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            bucket = self.buckets.setdefault(host, TokenBucket(self.rate, self.burst))
+        bucket.acquire()
+
+def make_session(pool_size=CRAWL_CONCURRENCY):
+    """Pooled HTTP session: keep-alive connections are reused across pages."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-def crawl_news():
-    print(f"🚀 Starting Massive Ingestion: {MAX_PAGES} Pages")
+def fetch_page(session, throttle, page_num):
+    """Downloads one listing page. Returns its HTML, or None on failure."""
+    target_url = f"{BASE_URL}{page_num}"
+    throttle.acquire(target_url)
+    print(f"\n📄 Scraping Page {page_num}: {target_url}")
+
+    response = session.get(target_url, timeout=30)
+    if response.status_code != 200:
+        print(f"❌ Failed to retrieve page {page_num} (Status: {response.status_code})")
+        return None
+    return response.text
+
+def parse_page(html):
+    """Extracts article dicts (title, date, url, content) from one listing page."""
+    soup = BeautifulSoup(html, 'lxml')
     
-    for page_num in range(START_PAGE, MAX_PAGES + 1):
-        target_url = f"{BASE_URL}{page_num}"
-        print(f"\n📄 Scraping Page {page_num}: {target_url}")
-        
-        try:
-            # Add headers to look like a real browser (Prevents blocking)
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            }
-            response = requests.get(target_url, headers=headers)
-            
-            if response.status_code != 200:
-                print(f"❌ Failed to retrieve page {page_num} (Status: {response.status_code})")
-                continue
+    # SELECTOR STRATEGY: Find all article cards
+    # Note: These class names are specific to standard news layouts. 
+    # If scraping a different site, inspect the HTML to find the right <div> class.
+    articles = soup.find_all("div", class_="col-md-4") 
+
+    if not articles:
+        print("⚠️ No articles found. Checking alternative layout...")
+        articles = soup.find_all("article")
+
+    print(f"   Found {len(articles)} articles. Processing...")
+    page_articles = []
 
-            soup = BeautifulSoup(response.text, 'lxml')
+    for article in articles:
+        try:
+            # Extract Data
+            title_tag = article.find("h3") or article.find("h2") or article.find("a")
+            date_tag = article.find("time") or article.find("span", class_="date")
             
-            # SELECTOR STRATEGY: Find all article cards
-            # Note: These class names are specific to standard news layouts. 
-            # If scraping a different site, inspect the HTML to find the right <div> class.
-            articles = soup.find_all("div", class_="col-md-4") 
-
-            if not articles:
-                print("⚠️ No articles found. Checking alternative layout...")
-                articles = soup.find_all("article")
-
-            print(f"   Found {len(articles)} articles. Processing...")
-
-            for article in articles:
-                try:
-                    # Extract Data
-                    title_tag = article.find("h3") or article.find("h2") or article.find("a")
-                    date_tag = article.find("time") or article.find("span", class_="date")
+            if title_tag:
+                title = title_tag.get_text(strip=True)
+                link = title_tag.find("a")['href'] if title_tag.find("a") else article.find("a")['href']
+                
+                # Handle relative links
+                link = urljoin(BASE_URL, link)
                     
-                    if title_tag:
-                        title = title_tag.get_text(strip=True)
-                        link = title_tag.find("a")['href'] if title_tag.find("a") else article.find("a")['href']
-                        
-                        # Handle relative links
-                        if link.startswith("/"):
-                            link = "https://nvidianews.nvidia.com" + link
-                            
-                        date = date_tag.get_text(strip=True) if date_tag else "Unknown Date"
-                        
-                        # Ingest into Neo4j
-                        ingest_article(title, date, link, title) # Using title as content summary for speed
-                        
-                except Exception as e:
-                    continue # Skip bad articles without crashing
-            
-            # Be polite to the server
-            time.sleep(2)
-
+                date = date_tag.get_text(strip=True) if date_tag else "Unknown Date"
+                
+                # Using title as content summary for speed
+                page_articles.append({"title": title, "date": date, "url": link, "content": title})
+                
         except Exception as e:
-            print(f"Critical Error on page {page_num}: {e}")
+            continue # Skip bad articles without crashing
+
+    return page_articles
+
+def crawl_news(max_pages=MAX_PAGES, concurrency=CRAWL_CONCURRENCY):
+    """
+    Fetches listing pages on a pool of workers sharing one pooled session, while this
+    thread parses and writes each page as soon as it arrives. Per-host token buckets
+    replace the old fixed sleep between pages.
+    """
+    print(f"🚀 Starting Massive Ingestion: {max_pages} Pages ({concurrency} parallel fetches)")
+
+    # Neo4j Connection (shared pooled driver, write sessions; nothing connects at import time)
+    warmup(write=True)
+    graph = get_graph(write=True)
+
+    # Every MERGE below relies on the per-label id constraints
+    ensure_schema(graph)
+
+    session = make_session(concurrency)
+    throttle = HostThrottle()
+    written = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(fetch_page, session, throttle, page_num): page_num
+            for page_num in range(START_PAGE, max_pages + 1)
+        }
+        for future in as_completed(futures):
+            page_num = futures[future]
+            try:
+                html = future.result()
+                if html is None:
+                    continue
+
+                # Ingest the whole page into Neo4j (overlaps with the remaining fetches)
+                written += ingest_articles(graph, parse_page(html))
+
+            except Exception as e:
+                print(f"Critical Error on page {page_num}: {e}")
+
+    session.close()
+
+    if written == 0:
+        # Nothing changed: keep the graph version so the agent's caches stay valid
+        print("\n✅ Ingestion Complete. Nothing new or changed.")
+        return
+
+    # Refresh the agent's entity lookup, invalidate its caches, store the schema
+    # and precompute hot neighborhoods
+    try:
+        EntityIndex().rebuild(graph)
+        version = bump_graph_version(graph)
+        save_schema_snapshot(graph, version)
+        NeighborhoodSnapshots().materialize(graph, version)
+    except Exception as e:
+        print(f"⚠️ Post-ingest refresh failed: {e}")
 
-    print("\n✅ Ingestion Complete. Knowledge Graph Updated.")
+    print(f"\n✅ Ingestion Complete. Knowledge Graph Updated ({written} changes).")
 
 if __name__ == "__main__":
-    crawl_news()
\ No newline at end of file
+    crawl_news()
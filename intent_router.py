@@ -0,0 +1,128 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+
+from entity_resolution import normalize
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+# Below this confidence the agent asks the LLM classifier instead
+ROUTER_CONFIDENCE = float(os.getenv("ROUTER_CONFIDENCE", "0.8"))
+# LLM intent decisions are logged here and used to train the local classifier
+INTENT_LOG_FILE = os.getenv("INTENT_LOG_FILE", ".intent_log.jsonl")
+MIN_EXAMPLES_PER_INTENT = 20
+
+# The Quick Intel buttons in app.py (always data questions)
+SUGGESTED_QUESTIONS = [
+    "Who supplies TSMC?",
+    "Identify critical supply chain risks.",
+    "What is connected to Nvidia?",
+    "What is the relationship between OpenAI and Microsoft?"
+]
+
+_SMALL_TALK = re.compile(
+    r"^(hi|hello|hey|yo|hiya|thanks|thank you|thx|ty|cheers|bye|goodbye|ok|okay|cool|great|nice|"
+    r"good (morning|afternoon|evening)|how are you)( there| sentinel| a lot| so much)?$"
+)
+_IDENTITY = re.compile(r"\b(who are you|what are you|your name|what can you do|help me use)\b")
+_DATA_WORDS = re.compile(
+    r"\b(suppl\w*|risks?|shortages?|tariffs?|partner\w*|compet\w*|products?|relationships?|"
+    r"connected|ceo|located|news|articles?|compan\w*|chips?|fabs?|delays?|sanctions?|earnings)\b"
+)
+
+
+class _NaiveBayes:
+    """Multinomial naive Bayes over question words, trained from the intent log."""
+    def __init__(self, examples):
+        self.word_counts = {}
+        self.class_counts = {}
+        self.vocab = set()
+        for text, intent in examples:
+            self.class_counts[intent] = self.class_counts.get(intent, 0) + 1
+            counts = self.word_counts.setdefault(intent, {})
+            for word in text.split():
+                counts[word] = counts.get(word, 0) + 1
+                self.vocab.add(word)
+        self.totals = {intent: sum(c.values()) for intent, c in self.word_counts.items()}
+
+    def ready(self):
+        return len(self.class_counts) >= 2 and min(self.class_counts.values()) >= MIN_EXAMPLES_PER_INTENT
+
+    def predict(self, text):
+        n = sum(self.class_counts.values())
+        scores = {}
+        for intent, count in self.class_counts.items():
+            score = math.log(count / n)
+            for word in text.split():
+                score += math.log(
+                    (self.word_counts[intent].get(word, 0) + 1) / (self.totals[intent] + len(self.vocab))
+                )
+            scores[intent] = score
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1.0 / norm
+
+
+class IntentRouter:
+    """
+    Microsecond local tier in front of the LLM intent classifier.
+    route() tries, in order: exact known questions, small-talk/identity rules,
+    known entity mentions and data keywords, then the classifier trained on
+    logged LLM decisions. Returns (intent or None, confidence, source).
+    """
+    def __init__(self, known_questions=SUGGESTED_QUESTIONS, entity_detector=None, log_path=INTENT_LOG_FILE):
+        self.known = {normalize(q): "DATA" for q in known_questions}
+        self.entity_detector = entity_detector
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.examples = self._load_log()
+        self.model = _NaiveBayes(self.examples)
+
+    def _load_log(self):
+        examples = []
+        if not self.log_path or not os.path.exists(self.log_path):
+            return examples
+        try:
+            with open(self.log_path, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    examples.append((normalize(entry["question"]), entry["intent"]))
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable intent log {self.log_path}: {e}")
+        return examples
+
+    def route(self, question):
+        text = normalize(question)
+        if text in self.known:
+            return self.known[text], 1.0, "known question"
+        if not text or _SMALL_TALK.match(text):
+            return "GENERAL", 0.99, "small talk"
+        if _IDENTITY.search(text):
+            return "GENERAL", 0.9, "identity"
+        if self.entity_detector and self.entity_detector(question):
+            return "DATA", 0.95, "entity mention"
+        if _DATA_WORDS.search(text):
+            return "DATA", 0.9, "data keyword"
+        if self.model.ready():
+            intent, confidence = self.model.predict(text)
+            return intent, confidence, "local classifier"
+        return None, 0.0, "no rule"
+
+    def record(self, question, intent):
+        """Logs an LLM decision so the local classifier can learn from it (retrained every 50 entries)."""
+        if not self.log_path:
+            return
+        with self.lock:
+            try:
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps({"question": question, "intent": intent}) + "\n")
+            except Exception as e:
+                logger.warning(f"Could not log intent: {e}")
+                return
+            self.examples.append((normalize(question), intent))
+            if len(self.examples) % 50 == 0:
+                self.model = _NaiveBayes(self.examples)
@@ -0,0 +1,201 @@
+import os
+import logging
+import threading
+from collections import Counter
+
+from graph_schema import ALLOWED_NODES
+from state_files import read_json, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+# Budgets for one visualization (explicit sizes instead of a row LIMIT)
+NEIGHBORHOOD_MAX_NODES = int(os.getenv("NEIGHBORHOOD_MAX_NODES", "60"))
+NEIGHBORHOOD_MAX_EDGES = int(os.getenv("NEIGHBORHOOD_MAX_EDGES", "150"))
+# Neighbors kept per expanded node, best-ranked first
+NEIGHBORHOOD_FAN_OUT = int(os.getenv("NEIGHBORHOOD_FAN_OUT", "12"))
+
+# Precomputed ego graphs for the hottest entities, rewritten after every ingest
+SNAPSHOT_FILE = os.getenv("NEIGHBORHOOD_SNAPSHOT_FILE", ".neighborhood_snapshots.json")
+SNAPSHOT_TOP_N = int(os.getenv("NEIGHBORHOOD_SNAPSHOT_TOP_N", "25"))
+# How often the agent visualized each entity (feeds the "most queried" half of the top N)
+QUERY_COUNTS_FILE = os.getenv("NEIGHBORHOOD_QUERY_COUNTS_FILE", ".neighborhood_queries.json")
+QUERY_COUNTS_FLUSH_EVERY = 20
+
+# Two hops around one indexed center node, computed server-side:
+#   hop 1: distinct neighbors of the center, ranked by MENTIONED_IN count, top $fan_out
+#   hop 2: per hop-1 node the same ranking, minus nodes already selected
+#   edges: distinct relationships among the selected nodes, up to $max_edges, tree edges
+#          first (center-hop1, then hop1-hop2) so the budget never strands a selected
+#          node, then cross edges (hop1-hop1, hop2-hop2) with whatever is left
+# Every relationship is traversed once per selected endpoint, so hub nodes no
+# longer explode into one row per path.
+NEIGHBORHOOD_QUERY = """
+MATCH (center:{label} {{id: $id}})
+WITH center LIMIT 1
+CALL {{
+    WITH center
+    MATCH (center)--(n1) WHERE n1 <> center
+    WITH DISTINCT n1
+    WITH n1, size([(n1)-[:MENTIONED_IN]-() | 1]) AS score
+    ORDER BY score DESC LIMIT $fan_out
+    RETURN collect(n1) AS hop1
+}}
+UNWIND CASE WHEN hop1 = [] THEN [null] ELSE hop1 END AS n1
+CALL {{
+    WITH center, hop1, n1
+    MATCH (n1)--(n2) WHERE n2 <> center AND NOT n2 IN hop1
+    WITH DISTINCT n2
+    WITH n2, size([(n2)-[:MENTIONED_IN]-() | 1]) AS score
+    ORDER BY score DESC LIMIT $fan_out
+    RETURN collect(n2) AS hop2
+}}
+WITH center, hop1, reduce(acc = [], h IN collect(hop2) | acc + [n IN h WHERE NOT n IN acc]) AS hop2
+WITH center, hop1, ([center] + hop1 + hop2)[..$max_nodes] AS nodes
+CALL {{
+    WITH center, hop1, nodes
+    UNWIND nodes AS a
+    MATCH (a)-[r]->(b) WHERE b IN nodes
+    WITH DISTINCT r, CASE
+        WHEN a = center OR b = center THEN 0
+        WHEN (a IN hop1) <> (b IN hop1) THEN 1
+        ELSE 2
+    END AS tier
+    ORDER BY tier
+    RETURN collect(r)[..$max_edges] AS rels
+}}
+RETURN
+    [n IN nodes | {{id: coalesce(n.id, n.title, n.url), group: labels(n)[0]}}] AS nodes,
+    [r IN rels | {{
+        source: coalesce(startNode(r).id, startNode(r).title, startNode(r).url),
+        target: coalesce(endNode(r).id, endNode(r).title, endNode(r).url),
+        type: type(r)
+    }}] AS edges
+"""
+
+
+def fetch_neighborhood(graph, label, entity_id, max_nodes=NEIGHBORHOOD_MAX_NODES,
+                       max_edges=NEIGHBORHOOD_MAX_EDGES, fan_out=NEIGHBORHOOD_FAN_OUT):
+    """
+    Distinct nodes and edges around (label {id: entity_id}), within the given budgets.
+    Returns {"nodes": [{id, label, group}], "edges": [{source, target, type}]} in the
+    streamlit-agraph shape, or None when the center node does not exist.
+    """
+    if label not in ALLOWED_NODES:
+        raise ValueError(f"Unknown entity label: {label}")
+    rows = graph.query(
+        NEIGHBORHOOD_QUERY.format(label=label),
+        params={"id": entity_id, "fan_out": fan_out, "max_nodes": max_nodes, "max_edges": max_edges}
+    )
+    if not rows:
+        return None
+    nodes = [
+        {"id": n["id"], "label": n["id"], "group": n["group"]}
+        for n in rows[0]["nodes"] if n["id"] is not None
+    ]
+    node_ids = {n["id"] for n in nodes}
+    edges = [e for e in rows[0]["edges"] if e["source"] in node_ids and e["target"] in node_ids]
+    logger.info(f"Neighborhood of {entity_id}: {len(nodes)} nodes, {len(edges)} edges.")
+    return {"nodes": nodes, "edges": edges}
+
+
+def _snapshot_key(label, entity_id):
+    return f"{label}:{entity_id}"
+
+
+def hot_entities(graph, top_n=SNAPSHOT_TOP_N, counts_path=QUERY_COUNTS_FILE):
+    """
+    (label, id) pairs worth materializing: the most-queried entities recorded by the
+    agent first, then the most-connected ones, top_n in total.
+    """
+    queried = Counter(read_json(counts_path, {}))
+    picked = []
+    for key, _ in queried.most_common(top_n):
+        label, _, entity_id = key.partition(":")
+        if label in ALLOWED_NODES:
+            picked.append((label, entity_id))
+
+    rows = graph.query(
+        """
+        MATCH (n) WHERE n.id IS NOT NULL AND any(l IN labels(n) WHERE l IN $labels)
+        WITH n, size([(n)--() | 1]) AS degree
+        ORDER BY degree DESC LIMIT $top_n
+        RETURN [l IN labels(n) WHERE l IN $labels][0] AS label, n.id AS id
+        """,
+        params={"labels": ALLOWED_NODES, "top_n": top_n}
+    )
+    for row in rows:
+        if len(picked) >= top_n:
+            break
+        if (row["label"], row["id"]) not in picked:
+            picked.append((row["label"], row["id"]))
+    return picked
+
+
+class NeighborhoodSnapshots:
+    """
+    Local file of precomputed ego-graph payloads ({label:id -> fetch_neighborhood()
+    output}) stamped with the graph version they were built from. Ingesters call
+    materialize() after bumping the version; the agent serves get() hits and falls
+    back to a live query for everything else (or when the stamp is outdated).
+    """
+    def __init__(self, path=SNAPSHOT_FILE, counts_path=QUERY_COUNTS_FILE):
+        self.path = path
+        self.counts_path = counts_path
+        self.lock = threading.Lock()
+        self.loaded_mtime = None
+        self.version = None
+        self.snapshots = {}
+        self.pending_counts = Counter()
+
+    def reload_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.loaded_mtime:
+            return
+        data = read_json(self.path, None)
+        if data is None:
+            return
+        with self.lock:
+            self.version = data.get("version")
+            self.snapshots = data.get("snapshots", {})
+            self.loaded_mtime = mtime
+
+    def get(self, label, entity_id, graph_version):
+        """Snapshot for the entity, or None if missing or built for another graph version."""
+        self.reload_if_changed()
+        with self.lock:
+            if self.version != graph_version:
+                return None
+            return self.snapshots.get(_snapshot_key(label, entity_id))
+
+    def record_query(self, label, entity_id):
+        """Counts a visualization; the counts are merged into the counts file every few calls."""
+        with self.lock:
+            self.pending_counts[_snapshot_key(label, entity_id)] += 1
+            if sum(self.pending_counts.values()) < QUERY_COUNTS_FLUSH_EVERY:
+                return
+            pending, self.pending_counts = self.pending_counts, Counter()
+        try:
+            counts = Counter(read_json(self.counts_path, {}))
+            counts.update(pending)
+            write_json_atomic(self.counts_path, dict(counts))
+        except Exception as e:
+            logger.warning(f"Could not save neighborhood query counts: {e}")
+
+    def materialize(self, graph, graph_version, top_n=SNAPSHOT_TOP_N):
+        """Recomputes the ego graphs of the hot entities and rewrites the snapshot file."""
+        snapshots = {}
+        for label, entity_id in hot_entities(graph, top_n, self.counts_path):
+            payload = fetch_neighborhood(graph, label, entity_id)
+            if payload is not None:
+                snapshots[_snapshot_key(label, entity_id)] = payload
+        write_json_atomic(self.path, {"version": graph_version, "snapshots": snapshots})
+        with self.lock:
+            self.version = graph_version
+            self.snapshots = snapshots
+            self.loaded_mtime = os.path.getmtime(self.path)
+        logger.info(f"Materialized {len(snapshots)} neighborhood snapshots (graph version {graph_version}).")
+        return len(snapshots)
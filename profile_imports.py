@@ -0,0 +1,35 @@
+import sys
+import subprocess
+
+# Modules on the app's cold-start path: what the login page needs vs. what loads after it
+LOGIN_PATH = ["streamlit", "auth", "intent_router"]
+AFTER_LOGIN = ["streamlit_agraph", "neo4j", "langchain_openai", "langchain_neo4j", "agent"]
+
+
+def import_time_ms(module):
+    """Cumulative import time of `module` in a fresh interpreter, from `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None
+    # Lines look like: "import time:       self [us] |  cumulative | imported package"
+    for line in reversed(result.stderr.splitlines()):
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000
+    return None
+
+
+def report(title, modules):
+    print(f"\n{title}")
+    for module in modules:
+        ms = import_time_ms(module)
+        print(f"  {module:<20} {'import failed' if ms is None else f'{ms:8.1f} ms'}")
+
+
+if __name__ == "__main__":
+    print("--- Import-Time Profile (fresh interpreter per module, shared deps counted in each) ---")
+    report("Login page (imported by app.py at startup):", LOGIN_PATH)
+    report("Deferred (background agent build / after login):", AFTER_LOGIN)
@@ -0,0 +1,25 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def write_json_atomic(path, data):
+    """Write-then-rename, so a crash mid-write never leaves a corrupt state file behind."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_json(path, default=None, name="state file"):
+    """Contents of a JSON state file, or `default` when it is missing or unreadable."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable {name} {path}: {e}")
+        return default
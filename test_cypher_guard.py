@@ -0,0 +1,81 @@
+import pytest
+
+import cypher_guard
+from cypher_guard import CypherRejected, cap_limit, cap_path_length, check_read_only, guard_cypher
+
+
+@pytest.mark.parametrize("cypher", [
+    "MATCH (c:Company {id: 'TSMC'})-[r]-(p:Product) RETURN c.id, type(r), p.id",
+    "MATCH (n) RETURN n.set, n.delete",
+    "MATCH (n) RETURN n {.set, .remove}",
+    "MATCH (c:Company) RETURN c.id AS create",
+    "MATCH (set:Company) RETURN set.id",
+    "MATCH (n {merge: 1}) RETURN n",
+    "MATCH (n) WHERE n.id = 'SET' OR n.id = \"DELETE\" RETURN n",
+    "MATCH (`create`) RETURN 1",
+    "CALL db.labels() YIELD label RETURN label",
+])
+def test_check_read_only_accepts_reads(cypher):
+    check_read_only(cypher)
+
+
+@pytest.mark.parametrize("cypher, clause", [
+    ("CREATE (n:Company {id: 'X'})", "CREATE"),
+    ("MATCH (n) SET n.x = 1", "SET"),
+    ("MATCH (n) SET n:Flagged", "SET"),
+    ("MATCH (n) DETACH DELETE n", "DETACH"),
+    ("MATCH (n) REMOVE n.x", "REMOVE"),
+    ("MERGE (n:Company {id: 'X'})", "MERGE"),
+    ("MATCH (a) WITH a AS x CREATE (b)", "CREATE"),
+    ("MATCH (n) FOREACH (x IN [1] | CREATE (m))", "FOREACH"),
+    ("LOAD CSV FROM 'file:///x.csv' AS row RETURN row", "LOAD CSV"),
+    ("CALL apoc.create.node(['X'], {}) YIELD node RETURN node", "CALL APOC.CREATE"),
+])
+def test_check_read_only_rejects_writes(cypher, clause):
+    with pytest.raises(CypherRejected, match=clause):
+        check_read_only(cypher)
+
+
+@pytest.mark.parametrize("cypher, expected", [
+    ("MATCH (a)-[*]-(b) RETURN b", "MATCH (a)-[*1..3]-(b) RETURN b"),
+    ("MATCH (a)-[r*2..]-(b) RETURN b", "MATCH (a)-[r*2..3]-(b) RETURN b"),
+    ("MATCH (a)-[:SUPPLIES_TO*..9]->(b) RETURN b", "MATCH (a)-[:SUPPLIES_TO*1..3]->(b) RETURN b"),
+    ("MATCH (a)-[*2]-(b) RETURN b", "MATCH (a)-[*2..2]-(b) RETURN b"),
+    ("MATCH (a)-[:A|B*1..2 {since: 2020}]-(b) RETURN b", "MATCH (a)-[:A|B*1..2 {since: 2020}]-(b) RETURN b"),
+    ("MATCH (a)-[r]-(b) RETURN b", "MATCH (a)-[r]-(b) RETURN b"),
+])
+def test_cap_path_length(cypher, expected):
+    assert cap_path_length(cypher, max_hops=3) == expected
+
+
+def test_cap_path_length_rejects_minimum_above_cap():
+    with pytest.raises(CypherRejected, match="at least 4 hops"):
+        cap_path_length("MATCH (a)-[*4..6]-(b) RETURN b", max_hops=3)
+
+
+@pytest.mark.parametrize("cypher, expected", [
+    ("MATCH (c) RETURN c.id", "MATCH (c) RETURN c.id\nLIMIT 10"),
+    ("MATCH (c) RETURN c.id LIMIT 50", "MATCH (c) RETURN c.id LIMIT 10"),
+    ("MATCH (c) RETURN c.id LIMIT 5;", "MATCH (c) RETURN c.id LIMIT 5"),
+    ("MATCH (c) RETURN c.id LIMIT $k", "MATCH (c) RETURN c.id LIMIT $k"),
+    ("MATCH (c) WITH c LIMIT 500 RETURN c.id", "MATCH (c) WITH c LIMIT 500 RETURN c.id\nLIMIT 10"),
+    ("CALL db.labels()", "CALL db.labels()"),
+])
+def test_cap_limit(cypher, expected):
+    assert cap_limit(cypher, 10) == expected
+
+
+def test_guard_cypher_tightens_hops_until_within_budget(monkeypatch):
+    estimates = {"*1..3": 1e9, "*1..2": 1e9, "*1..1": 10}
+    monkeypatch.setattr(cypher_guard, "estimate_rows", lambda cypher: next(
+        rows for hops, rows in estimates.items() if hops in cypher
+    ))
+    assert guard_cypher("MATCH (a)-[*]-(b) RETURN b", limit=10, max_rows=100) == (
+        "MATCH (a)-[*1..1]-(b) RETURN b\nLIMIT 10"
+    )
+
+
+def test_guard_cypher_reports_budget_when_hops_cannot_shrink(monkeypatch):
+    monkeypatch.setattr(cypher_guard, "estimate_rows", lambda cypher: 1e9)
+    with pytest.raises(CypherRejected, match="would touch about"):
+        guard_cypher("MATCH (a)-[*3..5]-(b) RETURN b", limit=10, max_rows=100)
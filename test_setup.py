@@ -1,6 +1,5 @@
 import os
 from dotenv import load_dotenv
-from neo4j import GraphDatabase
 
 # 1. Load the secrets from .env
 load_dotenv()
@@ -19,15 +18,11 @@ if os.getenv("NEWS_API_KEY"):
 else:
     print("❌ NewsAPI Key MISSING.")
 
-# Check Neo4j Connection
-uri = os.getenv("NEO4J_URI")
-user = os.getenv("NEO4J_USERNAME")
-password = os.getenv("NEO4J_PASSWORD")
-
+# Check Neo4j Connection (through the shared pooled driver)
 try:
-    driver = GraphDatabase.driver(uri, auth=(user, password))
-    driver.verify_connectivity()
-    print("✅ Neo4j Database Connected successfully!")
+    from graph_db import warmup
+    elapsed = warmup()
+    print(f"✅ Neo4j Database Connected successfully! (pool warmed in {elapsed:.2f}s)")
 except Exception as e:
     print(f"❌ Neo4j Connection FAILED: {e}")
 